@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Splats per second: per-pixel footprint math vs. the precomputed stamp.
+
+    python benchmarks/bench_splat.py [--impacts 20000] [--repeat 5]
+
+"per-pixel" and "stamp table" differ only in where the footprint weight
+comes from.  The third line is pp.splat_ellipse as the run uses it, which
+also grows the dirty box and counts coverage crossings.
+"""
+import os
+import sys
+import time
+import argparse
+os.environ["WARP_DISABLE_CUDA"] = "1"   # force CPU for Warp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import warp as wp
+
+from src.config import (WALL_W, WALL_H, WALL_OFFSET_X, STICK_INTENSITY,
+                        ELLIPSE_EDGE_POWER, COVER_THRESH)
+from src import particle_paint as pp
+
+
+# "before": the footprint evaluated per pixel, as the kernel used to do
+@wp.kernel
+def splat_per_pixel(hits: wp.array(dtype=wp.vec2f),
+                    wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                    tw: int, th: int,
+                    radx: int, radz: int, edge_pow: wp.float32,
+                    base_inten: wp.float32,
+                    acc: wp.array(dtype=wp.float32),
+                    fr:  wp.array(dtype=wp.float32)):
+    h = hits[wp.tid()]
+    u  = (h[0] - wall_x0) / wall_w
+    vv = h[1] / wall_h
+    cx = wp.int(u  * (wp.float32(tw) - 1.0))
+    cy = wp.int((1.0 - vv) * (wp.float32(th) - 1.0))
+    for dy in range(-radz, radz+1):
+        yy = cy + dy
+        if yy < 0 or yy >= th: continue
+        for dx in range(-radx, radx+1):
+            xx = cx + dx
+            if xx < 0 or xx >= tw: continue
+            fall = pp.splat_weight(dx, dy, radx, radz, edge_pow)
+            if fall <= 0.0:
+                continue
+            inten = base_inten * fall
+            wp.atomic_add(acc, yy * tw + xx, inten)
+            wp.atomic_add(fr,  yy * tw + xx, inten)
+
+
+# "after": the same loop reading the stamp table
+@wp.kernel
+def splat_stamp(hits: wp.array(dtype=wp.vec2f),
+                wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                tw: int, th: int,
+                radx: int, radz: int, stamp: wp.array(dtype=wp.float32),
+                base_inten: wp.float32,
+                acc: wp.array(dtype=wp.float32),
+                fr:  wp.array(dtype=wp.float32)):
+    h = hits[wp.tid()]
+    u  = (h[0] - wall_x0) / wall_w
+    vv = h[1] / wall_h
+    cx = wp.int(u  * (wp.float32(tw) - 1.0))
+    cy = wp.int((1.0 - vv) * (wp.float32(th) - 1.0))
+    sw = 2 * radx + 1
+    for dy in range(-radz, radz+1):
+        yy = cy + dy
+        if yy < 0 or yy >= th: continue
+        row = (dy + radz) * sw + radx
+        for dx in range(-radx, radx+1):
+            xx = cx + dx
+            if xx < 0 or xx >= tw: continue
+            fall = stamp[row + dx]
+            if fall <= 0.0:
+                continue
+            inten = base_inten * fall
+            wp.atomic_add(acc, yy * tw + xx, inten)
+            wp.atomic_add(fr,  yy * tw + xx, inten)
+
+
+# the run's splat: stamp table plus dirty box and coverage tracking
+@wp.kernel
+def splat_tracked(hits: wp.array(dtype=wp.vec2f),
+                  wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                  tw: int, th: int,
+                  radx: int, radz: int, stamp: wp.array(dtype=wp.float32),
+                  base_inten: wp.float32,
+                  acc: wp.array(dtype=wp.float32),
+                  fr:  wp.array(dtype=wp.float32),
+                  dirty: wp.array(dtype=wp.int32),
+                  cover: wp.array(dtype=wp.int32), cover_thr: wp.float32):
+    h = hits[wp.tid()]
+    pp.splat_ellipse(h[0], h[1], wp.float32(1.0), wall_x0, wall_w, wall_h, tw, th,
+                     radx, radz, stamp, base_inten, acc, fr, dirty, cover, cover_thr)
+
+
+def _time(kernel, n, inputs, repeat):
+    wp.launch(kernel, dim=n, device=pp.device, inputs=inputs)   # compile / warm
+    best = float("inf")
+    for _ in range(repeat):
+        wp.synchronize()
+        t0 = time.perf_counter()
+        wp.launch(kernel, dim=n, device=pp.device, inputs=inputs)
+        wp.synchronize()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--impacts", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    wp.init()
+
+    rng = np.random.default_rng(0)
+    hits = np.stack([WALL_OFFSET_X + rng.random(args.impacts) * WALL_W,
+                     rng.random(args.impacts) * WALL_H], axis=1).astype(np.float32)
+    hits = wp.from_numpy(hits, dtype=wp.vec2f, device=pp.device)
+
+    with pp.SprayContext() as ctx:
+        n_pix = ctx.surface.N
+        rx, rz = pp._splat_radii(ctx.cfg)
+        common = [np.float32(WALL_OFFSET_X), np.float32(WALL_W), np.float32(WALL_H),
+                  ctx.surface.W, ctx.surface.H, int(rx), int(rz)]
+
+        acc0 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        fr0 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        t_pix = _time(splat_per_pixel, args.impacts,
+                      [hits, *common, np.float32(ELLIPSE_EDGE_POWER),
+                       np.float32(STICK_INTENSITY), acc0, fr0], args.repeat)
+
+        acc1 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        fr1 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        t_stamp = _time(splat_stamp, args.impacts,
+                        [hits, *common, ctx.stamp,
+                         np.float32(STICK_INTENSITY), acc1, fr1], args.repeat)
+
+        acc2 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        fr2 = wp.zeros(n_pix, dtype=wp.float32, device=pp.device)
+        t_tracked = _time(splat_tracked, args.impacts,
+                          [hits, *common, ctx.stamp,
+                           np.float32(STICK_INTENSITY), acc2, fr2, ctx.surface.get_dirty(),
+                           ctx.surface.cover, np.float32(COVER_THRESH)], args.repeat)
+
+        diff = float(np.max(np.abs(acc0.numpy() - acc1.numpy())))
+    print(f"footprint {2*rx+1}x{2*rz+1} px, {args.impacts} impacts, best of {args.repeat}")
+    print(f"  per-pixel weights : {args.impacts / t_pix:12.0f} splats/s")
+    print(f"  stamp table       : {args.impacts / t_stamp:12.0f} splats/s   ({t_pix / t_stamp:.2f}x)")
+    print(f"  + dirty / coverage: {args.impacts / t_tracked:12.0f} splats/s   (pp.splat_ellipse)")
+    print(f"  max |difference|  : {diff:.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Per-stage timings over a config matrix, as JSON, checked against a baseline.
+
+    python benchmarks/bench_stages.py                                  # default matrix
+    python benchmarks/bench_stages.py TEXTURE_RES=256,1024 EMIT_PER_STEP=50 --repeat 5
+    python benchmarks/bench_stages.py --update-baseline                # store as the baseline
+
+Stages (best of --repeat, after one warm-up):
+    fan_sample_host  host _fan_angles_and_weights for one frame's particles
+                     (reference only: runs sample on device, inside spawn_fan)
+    spawn_fan        one frame's emission on device, fan sampling included
+    flight           integrate_and_splat_ellipse until PARTICLE_CAP particles have all landed
+    blur             gaussian_blur_both (unfused)
+    post_step        fused blur + decay + clamp (what the run uses)
+    download_rgb     texture -> uint8 RGB on the host
+    write_snapshot, build_template   USD export (matrix independent, run once; needs pxr)
+
+Results go to --out.  If the baseline file exists, every stage/params pair
+found in both is compared, and the exit status is 1 when one is slower than
+baseline * (1 + --tolerance).  Timings are only comparable on the same host,
+so no baseline is checked in: run once with --update-baseline on the machine
+that does the checking (it writes benchmarks/baseline.json), and again after
+an intended speed change.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+os.environ["WARP_DISABLE_CUDA"] = "1"   # force CPU for Warp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import warp as wp
+
+from src import config
+from src import particle_paint as pp
+from src.sweep import grid, parse_axis
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MATRIX = {
+    "TEXTURE_RES": [256, 512],
+    "EMIT_PER_STEP": [50, 200],
+    "PARTICLE_CAP": [20_000],
+    "ELLIPSE_RADIUS_PIX": [6, 13],
+}
+
+
+def _time(fn, repeat, setup=None):
+    """(best, median) wall seconds of fn() over repeat runs; setup() runs untimed before each."""
+    if setup is not None:
+        setup()
+    fn()                                    # warm-up (compile / caches)
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        wp.synchronize()
+        t0 = time.perf_counter()
+        fn()
+        wp.synchronize()
+        runs.append(time.perf_counter() - t0)
+    return min(runs), statistics.median(runs)
+
+
+def _result(stage, params, timing, work, unit):
+    best, median = timing
+    return {"stage": stage, "params": params, "best_s": best, "median_s": median,
+            "throughput": work / best if best > 0 else float("inf"), "unit": unit}
+
+# ---------------- simulation stages ----------------
+
+def _spawn(ctx, n):
+    """Emit n particles into ctx.live from the wall centre; returns how many are live."""
+    c = ctx.cfg
+    cmd = ctx._cmds[("spawn", ctx.live.ptr)]
+    cmd.set_param_at_index(pp._param(pp.spawn_fan, "start_idx"), 0)
+    cmd.set_param_at_index(pp._param(pp.spawn_fan, "n_emit"), int(n))
+    cmd.set_param_at_index(pp._param(pp.spawn_fan, "ox"), float(c.WALL_OFFSET_X + 0.5 * c.WALL_W))
+    cmd.set_param_at_index(pp._param(pp.spawn_fan, "oz"), float(0.5 * c.WALL_H))
+    cmd.set_dim(int(n))
+    ctx.alive.zero_()
+    ctx.live_count.zero_()
+    cmd.launch()
+    return int(ctx.live_count.numpy()[0])
+
+def _flight(ctx, n_live):
+    """Integrate (and splat) until every particle has landed, one thread per particle."""
+    src, n_dst = ctx.live, ctx.live_count_next
+    while n_live > 0:
+        n_dst.zero_()
+        cmd = ctx._cmds[("integrate", src.ptr)]
+        cmd.set_param_at_index(pp._param(pp.integrate_and_splat_ellipse, "stride"), int(n_live))
+        cmd.set_dim(n_live)
+        cmd.launch()
+        n_live = int(n_dst.numpy()[0])
+        if src is ctx.live:
+            src, n_dst = ctx.live_next, ctx.live_count
+        else:
+            src, n_dst = ctx.live, ctx.live_count_next
+
+def bench_point(params, repeat):
+    # the stages below are the stepped / atomic / dense pipeline
+    cfg = config.snapshot(**{**params, "IMPACT_MODE": "stepped", "DEPOSIT_MODE": "atomic",
+                             "PAINT_SURFACE": "dense", "METRICS_EVERY": 0})
+    n_emit = int(cfg.EMIT_PER_STEP)
+    cap = int(cfg.PARTICLE_CAP)
+    rng = np.random.default_rng(0)
+    out = []
+    with pp.SprayContext(cfg) as ctx:
+        ctx._cmds = ctx._record()
+        surf = ctx.surface
+        texels = surf.N
+
+        out.append(_result("fan_sample_host", params, _time(
+            lambda: pp._fan_angles_and_weights(n_emit, cfg, rng), repeat), n_emit, "particles/s"))
+        out.append(_result("spawn_fan", params, _time(
+            lambda: _spawn(ctx, n_emit), repeat), n_emit, "particles/s"))
+
+        state = {}
+        def setup():
+            state["n"] = _spawn(ctx, cap)
+        out.append(_result("flight", params, _time(
+            lambda: _flight(ctx, state["n"]), repeat, setup), cap, "particles/s"))
+
+        # the texture now holds paint from the flights above
+        out.append(_result("blur", params, _time(surf.gaussian_blur_both, repeat), texels, "texels/s"))
+        out.append(_result("post_step", params, _time(surf.post_step, repeat), texels, "texels/s"))
+        out.append(_result("download_rgb", params, _time(surf.download_rgb, repeat), texels, "texels/s"))
+    return out
+
+# ---------------- export stages ----------------
+
+def bench_export(repeat):
+    """USD snapshot and template, written under a scratch directory."""
+    try:
+        from src import visualize, wall_model
+    except ImportError as e:        # pxr (usd-core) missing
+        print(f"  skipping USD stages: {e}")
+        return []
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp(prefix="bench_stages_")
+    try:
+        os.chdir(tmp)                # OUT_DIR is relative
+        os.makedirs(config.OUT_DIR, exist_ok=True)
+        return [
+            _result("write_snapshot", {}, _time(
+                lambda: visualize.write_snapshot("mask_0000.png", 0, 0), repeat), 1, "frames/s"),
+            _result("build_template", {}, _time(wall_model.build_template, repeat), 1, "templates/s"),
+        ]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+# ---------------- baseline ----------------
+
+def _key(r):
+    return r["stage"], json.dumps(r["params"], sort_keys=True)
+
+def compare(results, baseline, tolerance):
+    """Attach baseline ratios to results; returns the regressed ones."""
+    base = {_key(r): r for r in baseline["results"]}
+    regressed = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        r["vs_baseline"] = r["best_s"] / b["best_s"] if b["best_s"] > 0 else float("inf")
+        if r["vs_baseline"] > 1.0 + tolerance:
+            regressed.append(r)
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("axes", nargs="*", type=parse_axis, metavar="NAME=v1,v2,...",
+                    help="matrix axes (replace the defaults of the same name)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-usd", action="store_true", help="skip write_snapshot / build_template")
+    ap.add_argument("--out", default=os.path.join(config.OUT_DIR, "bench_stages.json"))
+    ap.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"))
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs baseline (0.15 = 15%%)")
+    ap.add_argument("--update-baseline", action="store_true", help="write these results as the baseline")
+    args = ap.parse_args()
+
+    pp.warm()
+    matrix = dict(DEFAULT_MATRIX, **dict(args.axes))
+    results = []
+    for params in grid(**matrix):
+        print("  " + " ".join(f"{k}={v}" for k, v in params.items()))
+        results += bench_point(params, args.repeat)
+    if not args.no_usd:
+        results += bench_export(args.repeat)
+
+    report = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+                 "platform": platform.platform(), "python": platform.python_version(),
+                 "warp": wp.config.version, "cpus": os.cpu_count(), "repeat": args.repeat,
+                 "matrix": matrix},
+        "results": results,
+    }
+    regressed = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressed = compare(results, json.load(fh), args.tolerance)
+    elif not args.update_baseline:
+        print(f"  no baseline at {args.baseline}; --update-baseline stores this run as one")
+
+    for r in results:
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items()) or "-"
+        vs = f"  {100.0 * (r['vs_baseline'] - 1.0):+6.1f}%" if "vs_baseline" in r else ""
+        print(f"{r['stage']:15s} {params:70s} {r['best_s'] * 1e3:10.3f} ms "
+              f"{r['throughput']:14.0f} {r['unit']}{vs}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=1)
+    print(f"\nresults in {args.out}")
+    if args.update_baseline:
+        shutil.copyfile(args.out, args.baseline)
+        print(f"baseline updated: {args.baseline}")
+    if regressed:
+        print(f"{len(regressed)} stage(s) slower than baseline by more than {100 * args.tolerance:.0f}%:")
+        for r in regressed:
+            print(f"  {r['stage']} {r['params']}: {r['vs_baseline']:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Memory, post-step / readback time and error of the texel storage modes.
+
+    python benchmarks/bench_storage.py                       # 2000 steps at the config's texture
+    python benchmarks/bench_storage.py --steps 0             # the whole run (STEPS)
+    python benchmarks/bench_storage.py TEXTURE_MM_PER_PIX=5
+
+Every ACCUM_DTYPE / FRESH_DTYPE pair runs the same seeded steps (binned
+deposition, as 16-bit storage always uses) and is compared with float32:
+max / mean |accum difference|, coverage and mean.  bytes/step is what one
+post_step reads and writes (both layers and their scratch, two passes).
+"""
+import os
+import sys
+import time
+import argparse
+os.environ["WARP_DISABLE_CUDA"] = "1"   # force CPU for Warp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import warp as wp
+
+from src import config
+from src import particle_paint as pp
+from src.sweep import parse_axis
+from src.trajectory import trajectory
+
+PAIRS = [("float32", "float32"), ("float32", "float16"), ("float32", "fix16"), ("fix16", "fix16")]
+BYTES = {"float32": 4, "float16": 2, "fix16": 2}
+
+
+def _time(fn, repeat):
+    fn()
+    runs = []
+    for _ in range(repeat):
+        wp.synchronize()
+        t0 = time.perf_counter()
+        fn()
+        wp.synchronize()
+        runs.append(time.perf_counter() - t0)
+    return min(runs)
+
+
+def run_pair(acc, fr, overrides, steps, seed, repeat):
+    cfg = config.snapshot(**{**overrides, "DEPOSIT_MODE": "binned", "METRICS_EVERY": 0,
+                             "ACCUM_DTYPE": acc, "FRESH_DTYPE": fr, "RUN_SEED": seed})
+    poses = trajectory(cfg).poses[:steps or None]
+    with pp.SprayContext(cfg) as ctx:
+        t0 = time.perf_counter()
+        ctx.step_many(0, len(poses), poses)
+        run_s = time.perf_counter() - t0
+        s = ctx.surface
+        host = wp.empty(s.N, dtype=wp.float32, device="cpu")
+        return {
+            "acc": acc, "fr": fr, "W": s.W, "H": s.H, "steps": len(poses),
+            "bytes": s.allocated_bytes,
+            "bytes_step": 4 * s.N * (BYTES[acc] + BYTES[fr]),
+            "run_s": run_s,
+            "post_ms": 1e3 * _time(s.post_step, repeat),
+            "download_ms": 1e3 * _time(lambda: s.download_accum(host), repeat),
+            "rgb_ms": 1e3 * _time(s.download_rgb, repeat),
+            "accum": s.accum_numpy(),
+            "coverage": s.coverage_percent(),
+            "mean": s.metrics()["mean"],
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("overrides", nargs="*", type=parse_axis, metavar="NAME=value",
+                    help="config overrides (first value of each)")
+    ap.add_argument("--steps", type=int, default=2000, help="steps to run (0: all STEPS)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    overrides = {name: values[0] for name, values in args.overrides}
+
+    pp.warm()
+    rows = [run_pair(a, f, overrides, args.steps, args.seed, args.repeat) for a, f in PAIRS]
+    ref = rows[0]
+    print(f"{ref['W']}x{ref['H']} texels, {ref['steps']} steps, seed {args.seed}")
+    print(f"{'accum/fresh':17s} {'MB':>7s} {'MB/step':>8s} {'post ms':>8s} {'dl ms':>7s} {'rgb ms':>7s} "
+          f"{'max|d|':>9s} {'mean|d|':>9s} {'cov %':>8s} {'mean':>9s}")
+    for r in rows:
+        d = np.abs(r["accum"] - ref["accum"])
+        print(f"{r['acc'] + '/' + r['fr']:17s} {r['bytes'] / 1e6:7.2f} {r['bytes_step'] / 1e6:8.2f} "
+              f"{r['post_ms']:8.3f} {r['download_ms']:7.3f} {r['rgb_ms']:7.3f} "
+              f"{d.max():9.2e} {d.mean():9.2e} {r['coverage']:8.4f} {r['mean']:9.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
+"""Simulate the whole wall and write PNGs, USD and the CSV logs to OUT_DIR.
+
+    python run_simulation.py
+    python run_simulation.py --metrics-only [NAME=value ...] [--steps N] [--seed S]
+    python run_simulation.py --warm          # build / cache the kernels, then exit
+
+--metrics-only runs physics and deposition alone and prints the final
+coverage / uniformity metrics as one JSON object on stdout (the same row
+as sweep.run_variant); nothing is written and neither pxr nor PIL is
+imported.  --warm fills Warp's kernel cache ahead of time, so the first
+run (or short batch job) afterwards only loads the compiled kernels.
+"""
 import os
 os.environ["WARP_DISABLE_CUDA"] = "1"   # force CPU for Warp
 
-import numpy as np
-from PIL import Image
+import argparse
+import json
+import math
 
-from src.config import OUT_DIR, STEPS, VIEW_STRIDE, WALL_OFFSET_X
-from src import wall_model
-from src import paint_surface_warp as psw
-from src import particle_paint as pp
-from src import visualize
+from src.config import OUT_DIR, STEPS, VIEW_STRIDE, METRICS_FILE, COVERAGE_FILE, FPS, PROFILE, PROFILE_FILE
 
 
 
@@ -83,52 +92,88 @@ print("✅ Image Sequence material applied. Scrub timeline to see paint evolve."
 
 
 def main() -> None:
+    # USD (pxr) and PNG (PIL) output is only imported for a full run
+    from src import wall_model
+    from src import paint_surface_warp as psw
+    from src import particle_paint as pp
+    from src import visualize
+    from src import profiling
+    from src.frame_writer import FrameWriter
+    from src.sweep import write_csv
+    from src.stopping import StopRule
+    from src.trajectory import trajectory
+
     os.makedirs(OUT_DIR, exist_ok=True)
 
-    # Build template (contains full joint animation)
-    base_stage = wall_model.build_template()
+    # Stage timings (PROFILE); without it every span below is a no-op
+    if PROFILE:
+        profiling.start()
+    span = profiling.span
 
     # Reset paint
     psw.clear_mask()
 
     saved = 0
-    pngs = []
-
-    for f in range(STEPS):
-        # Wall-local target -> world X (offset) and Z
-        tx, tz = wall_model._nozzle_pose(f)
-        txw = WALL_OFFSET_X + tx
-        tzw = tz
-
-        # Physics: emit + integrate + deposit (CPU Warp)
-        pp.step_emit_and_sim(f, float(txw), float(tzw))
-
-        # Overspray / temporal effects
-        psw.gaussian_blur_both()
-        psw.decay_fresh()
-        psw.clamp_both()
-
-        # Save per stride
-        if (f % VIEW_STRIDE == 0) or (f == STEPS - 1):
-            r, g, b = psw.download_rgb()
-            rgb = np.stack([r, g, b], axis=2)
-            png_path = os.path.join(OUT_DIR, f"mask_{saved:04d}.png")
-            Image.fromarray(rgb).save(png_path)
-            pngs.append(png_path)
-
-            # Snapshot USD: arm frozen at this step, texture bound to this PNG
-            visualize.write_snapshot(png_path, saved, f)
 
-            print(f"saved frame {saved:03d} (step {f}/{STEPS-1})")
-            saved += 1
-
-    # Optional: animated USD swapping textures over time
-    visualize.write_anim(base_stage, pngs, out_name="paint_anim.usda")
-        # Animated USD for usdview / Omniverse
-    visualize.write_anim_usdview(base_stage, pngs, out_name="paint_anim_usdview.usda")
+    # World nozzle pose for every step (shared with the USD export)
+    poses = trajectory().poses
+
+    # Early termination (STOP_*); never fires when all are None
+    stop = StopRule()
+
+    f = 0
+    with span("simulate"), FrameWriter(OUT_DIR) as writer:   # includes draining the writer
+        while f < STEPS:
+            # advance to the next saved step in one call
+            last = min(STEPS - 1, (f // VIEW_STRIDE + 1) * VIEW_STRIDE) if f % VIEW_STRIDE else f
+            # Physics: emit + integrate + deposit (CPU Warp), then overspray / temporal effects
+            f += pp.step_many(f, last - f + 1, poses[f:last + 1], stop=stop) - 1
+
+            # Save per stride: PNG (+ snapshot USD with USD_SNAPSHOTS) is
+            # written in the background while the simulation continues
+            if (f % VIEW_STRIDE == 0) or (f == STEPS - 1) or stop.reason:
+                with span("save_frame"):
+                    writer.submit(psw.default_surface(), saved, f)
+                print(f"saved frame {saved:03d} (step {f}/{STEPS-1}) coverage={psw.coverage_percent():5.1f}%")
+                saved += 1
+            if stop.reason:
+                break
+            f += 1
+    n_steps = min(f + 1, STEPS)
+    if stop.reason:
+        print(f"   Stopped at step {f} ({n_steps / FPS:.1f} s simulated): {stop.reason}")
+    else:
+        print(f"   Ran all {n_steps} steps ({n_steps / FPS:.1f} s simulated)")
+
+    # Template (joint animation up to the last simulated step)
+    with span("build_template"):
+        base_stage = wall_model.build_template(n_steps)
+
+    # Coverage vs. time (running counter, every step)
+    history = pp.default_context().coverage_history
+    write_csv([{"step": s, "time_s": (s + 1) / FPS, "coverage_pct": c} for s, c in history],
+              os.path.join(OUT_DIR, COVERAGE_FILE))
+    print(f"   Coverage curve written: {os.path.join(OUT_DIR, COVERAGE_FILE)}")
+
+    # Per-step surface metrics (METRICS_EVERY)
+    log = pp.default_context().metrics_log
+    if log:
+        write_csv(log, os.path.join(OUT_DIR, METRICS_FILE))
+        print(f"   Metrics written: {os.path.join(OUT_DIR, METRICS_FILE)} ({len(log)} rows)")
+
+    # Animated USD (usdview / Omniverse): geometry once, time samples for the
+    # arm, target and texture of every saved frame
+    with span("write_paint_anim"):
+        anim_path = visualize.write_paint_anim(writer.paths, writer.steps)
+    print(f"   Animated USD written: {anim_path}")
+    if writer.stream_path is not None:
+        # FRAME_OUTPUT == "stream": the USD already points at these PNG names
+        print(f"   Frame stream written: {writer.stream_path}")
+        print(f"   make the PNGs with: python -m src.frame_stream {writer.stream_path}")
 
     # Blender stub (geometry + anim, placeholder material)
-    visualize.write_anim_blender_stub(base_stage, out_name="paint_anim_blender.usda")
+    with span("blender_stub"):
+        visualize.write_anim_blender_stub(base_stage, out_name="paint_anim_blender.usda")
 
     # Write a Blender helper that turns mask_*.png into an Image Sequence
     helper_path = os.path.join(OUT_DIR, "apply_blender_image_sequence.py")
@@ -136,9 +181,67 @@ def main() -> None:
         fh.write(BLENDER_HELPER_SCRIPT)
     print(f"   Blender helper written: {helper_path}")
 
+    summary = profiling.stop()
+    if summary is not None:
+        prof_path = os.path.join(OUT_DIR, PROFILE_FILE)
+        profiling.write_json(summary, prof_path)
+        print(f"   Profile written: {prof_path} ({summary['wall_s']:.1f} s wall)")
+        print(profiling.format_table(summary))
 
     print(f"\n✅ done. {saved} frames in {OUT_DIR}/")
 
 
+def metrics_only(overrides=None, steps=None, seed=None) -> dict:
+    """Physics and deposition only; returns the final metrics row (see sweep.run_variant)."""
+    from src import sweep
+    return sweep.run_variant(dict(overrides or {}), steps=steps, seed=seed)
+
+
+def _json_line(row: dict) -> str:
+    """row as strict JSON: NaN / inf (cv of an unpainted wall) become null."""
+    return json.dumps({k: None if isinstance(v, float) and not math.isfinite(v) else v
+                       for k, v in row.items()}, allow_nan=False)
+
+
+def _overrides(items):
+    """NAME=value strings -> dict; one value per name, names known to src/config.py."""
+    from src import config
+    from src.sweep import parse_axis
+    out = {}
+    for text in items:
+        name, values = parse_axis(text)
+        if len(values) != 1:
+            raise argparse.ArgumentTypeError(f"one value per name (run_sweep.py runs grids): {text!r}")
+        out[name] = values[0]
+    try:
+        config.snapshot(**out)
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(e.args[0]) from None
+    return out
+
+
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--metrics-only", action="store_true",
+                    help="no PNG / USD / CSV output; print the final metrics as JSON")
+    ap.add_argument("overrides", nargs="*", metavar="NAME=value",
+                    help="config overrides (--metrics-only)")
+    ap.add_argument("--steps", type=int, default=None, help="simulate at most N steps (--metrics-only)")
+    ap.add_argument("--seed", type=int, default=None, help="RUN_SEED (--metrics-only)")
+    ap.add_argument("--warm", action="store_true", help="compile or load the kernels and exit")
+    args = ap.parse_args()
+    if args.warm:
+        from src import particle_paint as pp
+        print(f"kernels ready in {pp.warm():.2f} s")
+    elif args.metrics_only:
+        import warp as wp
+        wp.config.quiet = True      # before Warp initialises: keep stdout to the JSON line
+        try:
+            overrides = _overrides(args.overrides)
+        except argparse.ArgumentTypeError as e:
+            ap.error(str(e))
+        print(_json_line(metrics_only(overrides, args.steps, args.seed)))
+    elif args.overrides or args.steps is not None or args.seed is not None:
+        ap.error("NAME=value, --steps and --seed need --metrics-only")
+    else:
+        main()
@@ -32,6 +32,11 @@ FAN_PROFILE      = "triangular"   # "triangular" | "cosine" | "flat"
 FAN_POWER        = 2.0            # for "cosine"
 FAN_WEIGHT_POWER = 1.0            # shapes triangular weighting across width
 
+# Every particle's random draws are keyed by (RUN_SEED, frame, particle
+# index): a run is bit-for-bit reproducible however its frames are batched
+# and in whichever process it runs.  None -> new spray every run.
+RUN_SEED         = 0
+
 # ======================== PARTICLE PHYSICS ========================
 PARTICLE_CAP       = 100_000
 EMIT_PER_STEP      = 50
@@ -39,22 +44,64 @@ PARTICLE_SPEED     = 6.0
 GRAVITY_Y          = 9.81
 AIR_DRAG           = 0.6
 STICK_INTENSITY    = 0.1
+IMPACT_MODE        = "stepped"   # "stepped" | "analytic" (hit solved at spawn, no per-frame state)
 
 # ======================== PAINT EFFECTS & TEXTURE ========================
 BASE_INTENSITY     = 1.0
 FALLOFF_POWER      = 2.0
 FRESH_DECAY        = 0.88
 
-# Texture and visual effects
-TEXTURE_RES     = 512
-GAUSS_SIGMA_PIX = 0.5
+# Restrict per-frame blur/decay/clamp to the recently painted region.
+# Paint outside it stops diffusing; fresh paint is tracked until it has
+# decayed below DIRTY_FRESH_EPS.
+DIRTY_REGION       = False
+DIRTY_FRESH_EPS    = 1e-3
+
+# Texture and visual effects.  With TEXTURE_MM_PER_PIX set, texels are
+# square and W x H follows the wall (ceil(WALL_W / size) x ceil(WALL_H / size));
+# None maps the wall onto TEXTURE_RES x TEXTURE_RES (non-square texels when
+# WALL_W != WALL_H).  GAUSS_SIGMA_M, when set, replaces GAUSS_SIGMA_PIX with a
+# physical blur width.
+TEXTURE_RES        = 512
+TEXTURE_MM_PER_PIX = None
+GAUSS_SIGMA_PIX    = 0.5
+GAUSS_SIGMA_M      = None
 COVER_THRESH    = 0.9
+UNDER_THRESH    = 0.5     # metrics: texels below this are under-sprayed
+OVER_THRESH     = 1.0     # metrics: texels at or above this are over-sprayed (accum clamps at 1)
 
-# Elliptical splat controls
+# Elliptical splat controls.  ELLIPSE_RADIUS_M, when set, gives the vertical
+# radius in metres instead, converted with the texel height (and the width
+# for rx), so the splat keeps its physical size at any texture resolution.
 ELLIPSE_RADIUS_PIX  = 13      # base vertical radius (pixels) – thin direction
+ELLIPSE_RADIUS_M    = None
 ELLIPSE_ASPECT_X    = 2.5    # stretch horizontally: rx = ELLIPSE_RADIUS_PIX * ASPECT
 ELLIPSE_EDGE_POWER  = 1.5    # 1: linear falloff to edge, >1 sharper core
 
+# Deposition: "atomic" splats straight into the texture; "binned" buffers
+# impacts, bins them per DEPOSIT_TILE x DEPOSIT_TILE tile and sums each tile
+# without atomics (less contention when the fan is concentrated)
+DEPOSIT_MODE = "atomic"
+DEPOSIT_TILE = 32
+
+# Paint surface: "dense" is one W x H texture for the whole wall; "tiled"
+# stores the same texture as PAINT_TILE x PAINT_TILE tiles, allocated only
+# where paint lands (for large walls; best with TEXTURE_MM_PER_PIX set).
+# Blur weaker than PAINT_TILE_EPS is not carried into unallocated tiles.
+# The tiled surface always deposits binned.
+PAINT_SURFACE      = "dense"
+PAINT_TILE         = 64
+PAINT_TILE_EPS     = 1e-4
+
+# Texel storage of the dense surface's layers: "float32", "float16" or
+# "fix16" (uint16 fixed point in [0, 2), steps of 2^-15).  16-bit layers
+# halve their memory and bandwidth and always deposit binned.  fresh never
+# feeds back into accum, so FRESH_DTYPE leaves the paint result unchanged.
+# ACCUM_DTYPE is "float32" or "fix16" (with FRESH_DTYPE "fix16"); see
+# Documentation.md for the error bound of a fix16 accum.
+ACCUM_DTYPE = "float32"
+FRESH_DTYPE = "float32"
+
 # Color darkness vs density
 REF_EMIT_PER_STEP = 1000
 COLOR_DENSITY_EXP = 1.0
@@ -85,6 +132,49 @@ MAX_SAVED_FRAMES = 100
 SAVE_EVERY       = max(1, STEPS // MAX_SAVED_FRAMES)
 OUT_DIR          = "outputs"
 
+# Background frame writer: PNG + USD snapshot are written on worker threads;
+# the simulation waits once WRITER_MAX_PENDING frames are queued
+WRITER_THREADS     = 2
+WRITER_MAX_PENDING = 4
+
+# USD export: one animated layer (paint_anim.<USD_FORMAT>) holds the geometry
+# once plus per-frame time samples; USD_SNAPSHOTS adds one frame_XXXX stage
+# per saved frame (arm frozen at that step)
+USD_FORMAT    = "usda"   # "usda" (text) | "usdc" (binary)
+USD_SNAPSHOTS = False
+
+# Saved frames: "png" encodes mask_XXXX.png during the run; "stream" appends
+# the float accum field to OUT_DIR/STREAM_FILE instead (memory-mappable; make
+# the PNGs afterwards with: python -m src.frame_stream outputs/paint_stream.bin)
+FRAME_OUTPUT     = "png"        # "png" | "stream"
+STREAM_FILE      = "paint_stream.bin"
+STREAM_DTYPE     = "float16"    # "float32" | "float16"
+STREAM_DELTA     = False        # store the change since the previous saved frame
+STREAM_KEY_EVERY = 16           # with STREAM_DELTA: a full frame every N saved frames
+
+# Surface metrics (coverage, mean/std/min/max, under/over) every
+# METRICS_EVERY steps, written to OUT_DIR/metrics.csv; 0 turns it off.
+# Each row is a full-texture reduction plus a device sync, so it is off
+# by default (coverage.csv comes from the running counter and is free).
+METRICS_EVERY    = 0
+METRICS_FILE     = "metrics.csv"
+COVERAGE_FILE    = "coverage.csv"   # coverage of every step (running counter, always written)
+
+# Per-stage timing of run_simulation (src/profiling.py): span totals,
+# per-call histograms and particle rates, written to OUT_DIR/PROFILE_FILE.
+# False leaves the hooks as no-ops.
+PROFILE      = False
+PROFILE_FILE = "profile.json"
+
+# Early termination (run_simulation and sweeps): stop once coverage reaches
+# STOP_COVERAGE_PCT, the coefficient of variation drops to STOP_CV, or
+# coverage gained less than STOP_PLATEAU_PCT over STOP_PLATEAU_STEPS steps.
+# None disables a criterion; the USD time range ends at the stop step.
+STOP_COVERAGE_PCT  = None
+STOP_CV            = None
+STOP_PLATEAU_PCT   = None
+STOP_PLATEAU_STEPS = 300
+
 # Animation control
 VIEW_STRIDE        = 40
 VIS_GAIN           = 1.0
@@ -101,3 +191,32 @@ PNG_BG_GRAY = 0.85            # 0..1 linear, used when PNG_BG_MODE=="gray"
 # STICK_RADIUS_PIX_MIN = 1     # kept (not used by ellipse kernel)
 # STICK_RADIUS_PIX_MAX = 3     # kept (not used by ellipse kernel)
 # PNG_WHITE_BG = True   # white wall background; red paint on top
+
+# ======================== PER-RUN SNAPSHOTS ========================
+
+class _Pinned(dict):
+    """Namespace that ignores re-assignment of the pinned (overridden) keys."""
+    def __init__(self, pinned):
+        super().__init__(pinned)
+        self._pinned = frozenset(pinned)
+
+    def __setitem__(self, key, value):
+        if key not in self._pinned:
+            super().__setitem__(key, value)
+
+def snapshot(**overrides):
+    """All settings as a namespace, with overrides applied.
+
+    This file is re-executed with the overridden names pinned, so derived
+    values (ROW_HEIGHT, FRAMES_PER_PASS, STEPS, ...) follow the overrides:
+        cfg = snapshot(FAN_THICK_DEG=30.0, TEXTURE_RES=256)
+    """
+    import types
+    unknown = [k for k in overrides if k not in globals() or not k.isupper()]
+    if unknown:
+        raise KeyError(f"unknown config name(s): {', '.join(sorted(unknown))}")
+    with open(__file__, encoding="utf-8") as fh:
+        code = compile(fh.read(), __file__, "exec")
+    ns = _Pinned(overrides)
+    exec(code, {"__name__": __name__, "__file__": __file__}, ns)
+    return types.SimpleNamespace(**{k: v for k, v in ns.items() if k.isupper()})
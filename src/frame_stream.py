@@ -0,0 +1,159 @@
+"""Raw paint-field stream: every saved frame's float accum in one file.
+
+Layout (little endian):
+
+    header   64 bytes   magic, version, H, W, dtype, delta, key_every,
+                        n_frames, index offset
+    frames   n_frames x H*W values (float32 or float16), back to back
+    index    n_frames records (step int64, key uint8), written by close()
+
+Frames have a fixed size, so the data block is memory-mappable as an
+(n_frames, H, W) array.  With delta=True every frame except each
+key_every-th stores the difference to the previous frame as stored, so
+quantisation does not build up across frames; FrameStream.frame() sums
+from the last key frame.
+
+After the run, PNGs are made from the stream instead of during it:
+
+    python -m src.frame_stream outputs/paint_stream.bin [--out outputs]
+"""
+import os
+import struct
+
+import numpy as np
+
+_MAGIC = b"PAINTFS1"
+_VERSION = 1
+_HEADER = struct.Struct("<8sIIIIIIQQ")
+_HEADER_BYTES = 64
+_DTYPES = {"float32": 0, "float16": 1}
+_INDEX = np.dtype([("step", "<i8"), ("key", "u1")])
+
+
+class FrameStreamWriter:
+    def __init__(self, path, H: int, W: int, dtype="float32", delta=False, key_every=16):
+        if dtype not in _DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(_DTYPES)}, got {dtype!r}")
+        self.path = path
+        self.H, self.W = int(H), int(W)
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.delta = bool(delta)
+        self.key_every = max(1, int(key_every))
+        self._code = _DTYPES[dtype]
+        self._index = []
+        self._prev = None   # previous frame as the reader will rebuild it
+        self._fh = open(path, "wb")
+        self._write_header(0, 0)
+
+    def _write_header(self, n_frames, index_offset):
+        hdr = _HEADER.pack(_MAGIC, _VERSION, self.H, self.W, self._code,
+                           int(self.delta), self.key_every, n_frames, index_offset)
+        self._fh.write(hdr.ljust(_HEADER_BYTES, b"\0"))
+
+    def append(self, acc, step: int):
+        """Store one (H, W) or flat float field for simulation step `step`."""
+        acc = np.asarray(acc, dtype=np.float32).reshape(self.H, self.W)
+        key = not self.delta or len(self._index) % self.key_every == 0
+        if key:
+            stored = acc.astype(self.dtype)
+            if self.delta:
+                self._prev = stored.astype(np.float32)
+        else:
+            stored = (acc - self._prev).astype(self.dtype)
+            self._prev += stored.astype(np.float32)
+        self._fh.write(stored.tobytes())
+        self._index.append((int(step), int(key)))
+
+    def close(self):
+        if self._fh is None:
+            return
+        index_offset = self._fh.tell()
+        np.array(self._index, dtype=_INDEX).tofile(self._fh)
+        self._fh.seek(0)
+        self._write_header(len(self._index), index_offset)
+        self._fh.close()
+        self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameStream:
+    """Read side: len(), steps, keys, raw (memmap) and frame(i) -> float32 (H, W)."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            hdr = fh.read(_HEADER.size)
+        magic, version, H, W, code, delta, key_every, n, index_offset = _HEADER.unpack(hdr)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path}: not a paint frame stream (v{_VERSION})")
+        self.H, self.W = H, W
+        self.dtype = np.dtype({v: k for k, v in _DTYPES.items()}[code]).newbyteorder("<")
+        self.delta = bool(delta)
+        self.key_every = key_every
+
+        frame_bytes = H * W * self.dtype.itemsize
+        if index_offset:
+            index = np.fromfile(path, dtype=_INDEX, count=n, offset=index_offset)
+        else:
+            # writer did not close: recover the complete frames, steps unknown
+            n = (os.path.getsize(path) - _HEADER_BYTES) // frame_bytes
+            index = np.zeros(n, dtype=_INDEX)
+            index["step"] = -1
+            index["key"] = (np.arange(n) % key_every == 0) if delta else 1
+        self.steps = index["step"]
+        self.keys = index["key"].astype(bool)
+        self.raw = np.memmap(path, dtype=self.dtype, mode="r", offset=_HEADER_BYTES,
+                             shape=(n, H, W)) if n else np.zeros((0, H, W), self.dtype)
+        self._cache = (None, None)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def frame(self, i: int) -> np.ndarray:
+        """The stored accum field of saved frame i as float32 (H, W)."""
+        i = range(len(self))[i]
+        if not self.delta:
+            return self.raw[i].astype(np.float32)
+        last, acc = self._cache
+        if last is None or last >= i or np.any(self.keys[last + 1:i + 1]):
+            last = int(np.flatnonzero(self.keys[:i + 1])[-1])
+            acc = self.raw[last].astype(np.float32)
+        for j in range(last + 1, i + 1):
+            acc = acc + self.raw[j]
+        self._cache = (i, acc)
+        return acc.copy()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frame(i)
+
+
+def export_pngs(path, out_dir=None, cfg=None):
+    """Write mask_XXXX.png for every frame of the stream; returns the paths."""
+    from PIL import Image
+    from . import config
+    from .paint_surface_warp import accum_to_rgb
+
+    cfg = cfg if cfg is not None else config
+    out_dir = out_dir if out_dir is not None else os.path.dirname(path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i, acc in enumerate(FrameStream(path)):
+        png_path = os.path.join(out_dir, f"mask_{i:04d}.png")
+        Image.fromarray(np.stack(accum_to_rgb(acc, cfg), axis=2)).save(png_path)
+        paths.append(png_path)
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Export mask_XXXX.png from a paint frame stream")
+    ap.add_argument("stream")
+    ap.add_argument("--out", default=None, help="output folder (default: next to the stream)")
+    args = ap.parse_args()
+    print(f"{len(export_pngs(args.stream, args.out))} PNGs written")
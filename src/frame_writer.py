@@ -0,0 +1,115 @@
+"""Background output for saved frames.
+
+The simulation thread only copies the texture into a free host buffer;
+colour mapping, PNG encoding and the USD snapshot run on a small thread
+pool.  When WRITER_MAX_PENDING frames are in flight, submit() waits for a
+buffer to come back (backpressure), so a slow disk throttles the solver
+instead of growing memory.
+
+    with FrameWriter() as writer:
+        ...
+        writer.submit(surface, idx, step)
+    pngs = writer.paths          # all written, in submission order (steps in writer.steps)
+"""
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import warp as wp
+from PIL import Image
+
+from . import config
+from . import profiling
+from .paint_surface_warp import accum_to_rgb
+from .frame_stream import FrameStreamWriter
+
+
+class FrameWriter:
+    def __init__(self, out_dir=None, usd=None, cfg=None, workers=None, max_pending=None):
+        self.cfg = cfg = cfg if cfg is not None else config.snapshot()
+        self.out_dir = out_dir if out_dir is not None else cfg.OUT_DIR
+        self.usd = cfg.USD_SNAPSHOTS if usd is None else usd
+        self.max_pending = int(max_pending if max_pending is not None else cfg.WRITER_MAX_PENDING)
+        # FRAME_OUTPUT == "stream": append the float field instead of encoding
+        # PNGs (one thread keeps the appends in order)
+        self.stream_path = (os.path.join(self.out_dir, cfg.STREAM_FILE)
+                            if cfg.FRAME_OUTPUT == "stream" else None)
+        self._stream = None
+        if self.stream_path is not None:
+            workers = 1
+        self._pool = ThreadPoolExecutor(int(workers if workers is not None else cfg.WRITER_THREADS),
+                                        thread_name_prefix="frame-writer")
+        self._free = queue.Queue()    # host buffers not in use; allocated on first submit
+        self._shape = None
+        self._futures = []
+        self.paths = []
+        self.steps = []
+
+    def submit(self, surface, idx: int, step: int) -> str:
+        """Queue mask_{idx}.png (and the frame_{idx} USD snapshot) for the surface as it is now.
+
+        In stream mode the field is appended to stream_path instead and the
+        returned PNG path is where frame_stream.export_pngs() will put it.
+
+        Blocks while max_pending frames are still being written.  Raises the
+        first error from an earlier frame.
+        """
+        self._check()
+        if self._shape is None:
+            self._shape = (surface.H, surface.W)
+            if self.stream_path is not None:
+                c = self.cfg
+                self._stream = FrameStreamWriter(self.stream_path, surface.H, surface.W,
+                                                 c.STREAM_DTYPE, c.STREAM_DELTA, c.STREAM_KEY_EVERY)
+            for _ in range(self.max_pending):
+                self._free.put(wp.empty(surface.N, dtype=wp.float32, device="cpu"))
+        with profiling.span("writer_wait"):
+            buf = self._free.get()
+        with profiling.span("download", sync=True):
+            surface.download_accum(buf)
+
+        png_path = os.path.join(self.out_dir, f"mask_{idx:04d}.png")
+        self._futures.append(self._pool.submit(self._write, buf, png_path, idx, step))
+        self.paths.append(png_path)
+        self.steps.append(step)
+        return png_path
+
+    def _write(self, buf, png_path, idx, step):
+        try:
+            if self._stream is not None:
+                with profiling.span("stream_append"):
+                    self._stream.append(buf.numpy(), step)
+            else:
+                with profiling.span("colour_map"):
+                    rgb = accum_to_rgb(buf.numpy().reshape(self._shape), self.cfg)
+        finally:
+            self._free.put(buf)
+        if self._stream is None:
+            with profiling.span("png_encode"):
+                Image.fromarray(np.stack(rgb, axis=2)).save(png_path)
+        if self.usd:
+            from . import visualize
+            with profiling.span("usd_snapshot"):
+                visualize.write_snapshot(png_path, idx, step)
+
+    def _check(self):
+        while self._futures and self._futures[0].done():
+            self._futures.pop(0).result()
+
+    def close(self):
+        """Wait for every queued frame, in order; re-raises the first failure."""
+        try:
+            for f in self._futures:
+                f.result()
+        finally:
+            self._futures = []
+            self._pool.shutdown(wait=True)
+            if self._stream is not None:
+                self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,35 +1,124 @@
+import math
+import collections
+from typing import Any
+
 import numpy as np
 import warp as wp
-from .config import (
-    TEXTURE_RES, GAUSS_SIGMA_PIX, COVER_THRESH, FRESH_DECAY, VIS_GAIN,
-    EMIT_PER_STEP, REF_EMIT_PER_STEP, COLOR_DENSITY_EXP,
-)
+import warp.utils
+from . import config
 
-wp.init()
+# Warp is initialised by the first surface (wp.init() is idempotent), not on import
 device = "cpu"
 
-W = TEXTURE_RES
-H = TEXTURE_RES
-N = W * H
-
-_tex_accum = wp.zeros(N, dtype=wp.float32, device=device)  # accumulated
-_tex_fresh = wp.zeros(N, dtype=wp.float32, device=device)  # per-step
-
-# ---- Gaussian weights ----
-if GAUSS_SIGMA_PIX <= 0:
-    _radius = 0
-    weights = np.array([1.0], dtype=np.float32)
-else:
-    _radius = max(1, int(3 * GAUSS_SIGMA_PIX))
-    xs = np.arange(-_radius, _radius + 1, dtype=np.float32)
-    weights = np.exp(-0.5 * (xs / GAUSS_SIGMA_PIX) ** 2).astype(np.float32)
+def texture_size(cfg=config):
+    """(W, H) of the paint texture: square texels of TEXTURE_MM_PER_PIX over
+    the wall, or TEXTURE_RES x TEXTURE_RES when that is None."""
+    mm = cfg.TEXTURE_MM_PER_PIX
+    if mm is None:
+        return int(cfg.TEXTURE_RES), int(cfg.TEXTURE_RES)
+    mm = float(mm)
+    if not mm > 0.0:
+        raise ValueError(f"TEXTURE_MM_PER_PIX must be > 0, got {mm!r}")
+    return (max(1, math.ceil(round(cfg.WALL_W * 1000.0 / mm, 6))),
+            max(1, math.ceil(round(cfg.WALL_H * 1000.0 / mm, 6))))
+
+def texel_size(cfg=config):
+    """(width, height) of one texel in metres."""
+    W, H = texture_size(cfg)
+    return cfg.WALL_W / W, cfg.WALL_H / H
+
+def blur_sigma_pix(cfg=config):
+    """GAUSS_SIGMA_PIX, or GAUSS_SIGMA_M over the (geometric mean) texel size."""
+    if cfg.GAUSS_SIGMA_M is None:
+        return float(cfg.GAUSS_SIGMA_PIX)
+    tw, th = texel_size(cfg)
+    return float(cfg.GAUSS_SIGMA_M) / math.sqrt(tw * th)
+
+def _gauss_weights(sigma):
+    """Normalised 1-D Gaussian taps -> (radius, weights)."""
+    if sigma <= 0:
+        return 0, np.array([1.0], dtype=np.float32)
+    radius = max(1, int(3 * sigma))
+    xs = np.arange(-radius, radius + 1, dtype=np.float32)
+    weights = np.exp(-0.5 * (xs / sigma) ** 2).astype(np.float32)
     weights /= weights.sum()
+    return radius, weights
+
+# ---- texel storage ----
+# The dense surface keeps each layer in ACCUM_DTYPE / FRESH_DTYPE: "float32",
+# "float16", or "fix16" (uint16 fixed point, value = u / FIX16_ONE, so
+# [0, 2) in steps of 2^-15; stores saturate at the top).  Kernels read and
+# write layers through texel_load / texel_store, overloaded on the array
+# dtype, and compute in float32; for float32 arrays both are plain accesses.
+# texel_round(a, v) is v as a would store it, for counting threshold
+# crossings on the value actually kept.
+# Kernels with such generic (Any) layers take scalars as Python floats:
+# Warp cannot infer a kernel overload from numpy scalars.
+
+STORAGE_DTYPES = {"float32": wp.float32, "float16": wp.float16, "fix16": wp.uint16}
+FIX16_ONE = wp.constant(32768.0)
+
+@wp.func
+def texel_load(a: wp.array(dtype=wp.float32), i: int):
+    return a[i]
+
+@wp.func
+def texel_load(a: wp.array(dtype=wp.float16), i: int):
+    return wp.float32(a[i])
+
+@wp.func
+def texel_load(a: wp.array(dtype=wp.uint16), i: int):
+    return wp.float32(a[i]) * (1.0 / FIX16_ONE)
+
+@wp.func
+def texel_store(a: wp.array(dtype=wp.float32), i: int, v: wp.float32):
+    a[i] = v
+
+@wp.func
+def texel_store(a: wp.array(dtype=wp.float16), i: int, v: wp.float32):
+    a[i] = wp.float16(v)
 
-_w = wp.from_numpy(weights, dtype=wp.float32, device=device)
-W_LEN = int(weights.shape[0])
+@wp.func
+def texel_store(a: wp.array(dtype=wp.uint16), i: int, v: wp.float32):
+    a[i] = wp.uint16(wp.clamp(v * FIX16_ONE + 0.5, 0.0, 65535.0))
+
+@wp.func
+def texel_round(a: wp.array(dtype=wp.float32), v: wp.float32):
+    return v
+
+@wp.func
+def texel_round(a: wp.array(dtype=wp.float16), v: wp.float32):
+    return wp.float32(wp.float16(v))
+
+@wp.func
+def texel_round(a: wp.array(dtype=wp.uint16), v: wp.float32):
+    return wp.floor(wp.clamp(v * FIX16_ONE + 0.5, 0.0, 65535.0)) * (1.0 / FIX16_ONE)
+
+def layer_dtypes(cfg=config):
+    """(accum, fresh) Warp dtypes from ACCUM_DTYPE / FRESH_DTYPE.
+
+    fresh may use any storage.  accum is float32 or fix16, whose rounding
+    error has a fixed bound per step; fix16 accum needs fix16 fresh (the
+    kernel overloads built below).  float16 accum is refused: it drops
+    increments below half an ulp of the running total, which biases the
+    result and the coverage metric.
+    """
+    if cfg.FRESH_DTYPE not in STORAGE_DTYPES:
+        raise ValueError(f"FRESH_DTYPE must be one of {sorted(STORAGE_DTYPES)}, got {cfg.FRESH_DTYPE!r}")
+    if cfg.ACCUM_DTYPE not in ("float32", "fix16"):
+        raise ValueError(f"ACCUM_DTYPE must be 'float32' or 'fix16', got {cfg.ACCUM_DTYPE!r}")
+    if cfg.ACCUM_DTYPE == "fix16" and cfg.FRESH_DTYPE != "fix16":
+        raise ValueError(f"ACCUM_DTYPE='fix16' needs FRESH_DTYPE='fix16', got {cfg.FRESH_DTYPE!r}")
+    return STORAGE_DTYPES[cfg.ACCUM_DTYPE], STORAGE_DTYPES[cfg.FRESH_DTYPE]
+
+def decode_texels(a):
+    """Host array of stored texels (any storage dtype) -> float32 values."""
+    if a.dtype == np.uint16:
+        return a.astype(np.float32) * np.float32(1.0 / FIX16_ONE)   # as texel_load
+    return a.astype(np.float32, copy=False)
 
 @wp.kernel
-def blur_h(src: wp.array(dtype=wp.float32), dst: wp.array(dtype=wp.float32),
+def blur_h(src: wp.array(dtype=Any), dst: wp.array(dtype=Any),
            w: int, h: int, radius: int,
            weights: wp.array(dtype=wp.float32), wlen: int):
     tid = wp.tid()
@@ -41,11 +130,11 @@ def blur_h(src: wp.array(dtype=wp.float32), dst: wp.array(dtype=wp.float32),
         xx = x + dx
         if xx < 0: xx = 0
         elif xx >= w: xx = w - 1
-        s += src[y*w + xx] * weights[k]
-    dst[tid] = s
+        s += texel_load(src, y*w + xx) * weights[k]
+    texel_store(dst, tid, s)
 
 @wp.kernel
-def blur_v(src: wp.array(dtype=wp.float32), dst: wp.array(dtype=wp.float32),
+def blur_v(src: wp.array(dtype=Any), dst: wp.array(dtype=Any),
            w: int, h: int, radius: int,
            weights: wp.array(dtype=wp.float32), wlen: int):
     tid = wp.tid()
@@ -57,68 +146,421 @@ def blur_v(src: wp.array(dtype=wp.float32), dst: wp.array(dtype=wp.float32),
         yy = y + dy
         if yy < 0: yy = 0
         elif yy >= h: yy = h - 1
-        s += src[yy*w + x] * weights[k]
-    dst[tid] = s
+        s += texel_load(src, yy*w + x) * weights[k]
+    texel_store(dst, tid, s)
 
 @wp.kernel
-def clamp01(tex: wp.array(dtype=wp.float32)):
+def clamp01(tex: wp.array(dtype=Any)):
     tid = wp.tid()
-    v = tex[tid]
+    v = texel_load(tex, tid)
     if v < 0.0: v = 0.0
     elif v > 1.0: v = 1.0
-    tex[tid] = v
+    texel_store(tex, tid, v)
 
 @wp.kernel
-def decay(tex: wp.array(dtype=wp.float32), f: wp.float32):
+def decay(tex: wp.array(dtype=Any), f: wp.float32):
     tid = wp.tid()
-    tex[tid] *= f
+    texel_store(tex, tid, texel_load(tex, tid) * f)
+
+# ---- fused post-step: blur both layers, decay fresh, clamp ----
+
+# All three run over the rectangle [x0, x0+rw) x [y0, ...) of the texture;
+# the full texture is x0 = y0 = 0, rw = w.
 
 @wp.kernel
-def coverage_count(tex: wp.array(dtype=wp.float32),
-                   thr: wp.float32, counter: wp.array(dtype=int)):
+def blur_h_both(acc: wp.array(dtype=Any), fr: wp.array(dtype=Any),
+                tmp_acc: wp.array(dtype=Any), tmp_fr: wp.array(dtype=Any),
+                w: int, h: int, radius: int,
+                weights: wp.array(dtype=wp.float32), wlen: int,
+                x0: int, y0: int, rw: int):
+    x = x0 + wp.tid() % rw
+    y = y0 + wp.tid() // rw
+    tid = y*w + x
+    sa = wp.float32(0.0)
+    sf = wp.float32(0.0)
+    for k in range(wlen):
+        xx = x + k - radius
+        if xx < 0: xx = 0
+        elif xx >= w: xx = w - 1
+        wk = weights[k]
+        sa += texel_load(acc, y*w + xx) * wk
+        sf += texel_load(fr, y*w + xx) * wk
+    texel_store(tmp_acc, tid, sa)
+    texel_store(tmp_fr, tid, sf)
+
+@wp.kernel
+def blur_v_decay_clamp(tmp_acc: wp.array(dtype=Any), tmp_fr: wp.array(dtype=Any),
+                       acc: wp.array(dtype=Any), fr: wp.array(dtype=Any),
+                       w: int, h: int, radius: int,
+                       weights: wp.array(dtype=wp.float32), wlen: int,
+                       f: wp.float32,
+                       x0: int, y0: int, rw: int,
+                       cover_thr: wp.float32, cover: wp.array(dtype=wp.int32)):
+    x = x0 + wp.tid() % rw
+    y = y0 + wp.tid() // rw
+    tid = y*w + x
+    sa = wp.float32(0.0)
+    sf = wp.float32(0.0)
+    for k in range(wlen):
+        yy = y + k - radius
+        if yy < 0: yy = 0
+        elif yy >= h: yy = h - 1
+        wk = weights[k]
+        sa += texel_load(tmp_acc, yy*w + x) * wk
+        sf += texel_load(tmp_fr, yy*w + x) * wk
+    new = texel_round(acc, wp.clamp(sa, 0.0, 1.0))
+    track_cover(texel_load(acc, tid), new, cover_thr, y, cover)
+    texel_store(acc, tid, new)
+    texel_store(fr, tid, wp.clamp(sf * f, 0.0, 1.0))
+
+@wp.kernel
+def decay_clamp(acc: wp.array(dtype=Any), fr: wp.array(dtype=Any),
+                f: wp.float32, w: int,
+                x0: int, y0: int, rw: int):
+    tid = (y0 + wp.tid() // rw) * w + x0 + wp.tid() % rw
+    texel_store(acc, tid, wp.clamp(texel_load(acc, tid), 0.0, 1.0))
+    texel_store(fr, tid, wp.clamp(texel_load(fr, tid) * f, 0.0, 1.0))
+
+# ---- quality metrics ----
+# Two-level reduction without atomics: each reduce_block thread folds one
+# REDUCE_BLOCK-texel chunk into a row of partials, reduce_partials folds
+# the rows into stats.  Row / stats layout (STAT_*): texels, covered,
+# under, over, sum, sum of squares, min, max.  With paged != 0, acc is a
+# tile pool and texels outside the wall (edge tiles) are skipped.
+
+REDUCE_BLOCK = 1024
+STAT_N, STAT_COVER, STAT_UNDER, STAT_OVER, STAT_SUM, STAT_SUM2, STAT_MIN, STAT_MAX = range(8)
+N_STATS = 8
+
+@wp.kernel
+def reduce_block(acc: wp.array(dtype=Any), n: int, block: int,
+                 cover: wp.float32, under: wp.float32, over: wp.float32,
+                 paged: int, slot_tile: wp.array(dtype=wp.int32),
+                 tile: int, tiles_x: int, w: int, h: int,
+                 partials: wp.array2d(dtype=wp.float64)):
+    b = wp.tid()
+    i1 = wp.min((b + 1) * block, n)
+    cnt = wp.float64(0.0)
+    n_cover = wp.float64(0.0)
+    n_under = wp.float64(0.0)
+    n_over = wp.float64(0.0)
+    s = wp.float64(0.0)
+    s2 = wp.float64(0.0)
+    lo = wp.float64(1.0e30)
+    hi = wp.float64(-1.0e30)
+    for i in range(b * block, i1):
+        if paged != 0:
+            c = slot_texel(i, slot_tile, tile, tiles_x)
+            if c[0] >= w or c[1] >= h:
+                continue
+        v = texel_load(acc, i)
+        vd = wp.float64(v)
+        cnt += wp.float64(1.0)
+        if v >= cover:
+            n_cover += wp.float64(1.0)
+        if v < under:
+            n_under += wp.float64(1.0)
+        if v >= over:
+            n_over += wp.float64(1.0)
+        s += vd
+        s2 += vd * vd
+        lo = wp.min(lo, vd)
+        hi = wp.max(hi, vd)
+    partials[b, 0] = cnt
+    partials[b, 1] = n_cover
+    partials[b, 2] = n_under
+    partials[b, 3] = n_over
+    partials[b, 4] = s
+    partials[b, 5] = s2
+    partials[b, 6] = lo
+    partials[b, 7] = hi
+
+@wp.kernel
+def reduce_partials(partials: wp.array2d(dtype=wp.float64), n_blocks: int,
+                    stats: wp.array(dtype=wp.float64)):
+    k = wp.tid()
+    r = partials[0, k]
+    for b in range(1, n_blocks):
+        v = partials[b, k]
+        if k == 6:    # STAT_MIN
+            r = wp.min(r, v)
+        elif k == 7:  # STAT_MAX
+            r = wp.max(r, v)
+        else:
+            r += v
+    stats[k] = r
+
+# ---- incremental coverage ----
+# cover[0] is the number of texels with accum >= COVER_THRESH and
+# cover[1 + y] the same for row y.  Every kernel that writes accum knows
+# the old and new value of the texels it owns and counts crossings, so
+# coverage never needs a full-texture pass.  Clamping to [0, 1] cannot
+# cross a threshold <= 1, so decay_clamp does not track.
+
+@wp.func
+def track_cover(old: wp.float32, new: wp.float32, thr: wp.float32, y: int,
+                cover: wp.array(dtype=wp.int32)):
+    if old < thr and new >= thr:
+        wp.atomic_add(cover, 0, 1)
+        wp.atomic_add(cover, y + 1, 1)
+    elif old >= thr and new < thr:
+        wp.atomic_add(cover, 0, -1)
+        wp.atomic_add(cover, y + 1, -1)
+
+@wp.kernel
+def count_cover(acc: wp.array(dtype=Any), w: int, thr: wp.float32,
+                cover: wp.array(dtype=wp.int32)):
+    # full recount (after the unfused legacy blur / clamp)
     tid = wp.tid()
-    if tex[tid] >= thr:
-        wp.atomic_add(counter, 0, 1)
+    if texel_load(acc, tid) >= thr:
+        wp.atomic_add(cover, 0, 1)
+        wp.atomic_add(cover, tid // w + 1, 1)
+
+# ---- dirty region ----
+# Deposits grow a pixel bounding box [x0, y0, x1, y1] (inclusive) with
+# atomic min/max, once per splat.  With DIRTY_REGION the post-step only
+# touches the union of the boxes of the last dirty_keep frames (how long
+# fresh paint takes to decay below DIRTY_FRESH_EPS) plus the blur radius.
+# Texels around the region are read but not written, so its edge blurs
+# against them as fixed values: paint is not conserved frame by frame
+# (see Documentation.md for the measured difference to the full pipeline).
+
+@wp.func
+def mark_dirty(cx: int, cy: int, radx: int, radz: int, tw: int, th: int,
+               dirty: wp.array(dtype=wp.int32)):
+    wp.atomic_min(dirty, 0, wp.max(cx - radx, 0))
+    wp.atomic_min(dirty, 1, wp.max(cy - radz, 0))
+    wp.atomic_max(dirty, 2, wp.min(cx + radx, tw - 1))
+    wp.atomic_max(dirty, 3, wp.min(cy + radz, th - 1))
 
-def get_accum(): return _tex_accum
-def get_fresh(): return _tex_fresh
+# ---- binned deposition ----
+# Impacts are (hx, hz, weight) in world metres.  They are binned by the
+# DEPOSIT_TILE x DEPOSIT_TILE texture tiles their footprint overlaps, then
+# every pixel of an active tile sums its own bin - no atomics on the texture.
 
-def clear_mask():
-    _tex_accum.zero_()
-    _tex_fresh.zero_()
+@wp.func
+def hit_texel(hx: wp.float32, hz: wp.float32,
+              wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+              tw: int, th: int):
+    u  = (hx - wall_x0) / wall_w
+    vv = hz / wall_h
+    return wp.vec2i(wp.int(u * (wp.float32(tw) - 1.0)),
+                    wp.int((1.0 - vv) * (wp.float32(th) - 1.0)))
+
+@wp.kernel
+def bin_impacts(hits: wp.array(dtype=wp.vec3f),
+                wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                tw: int, th: int, radx: int, radz: int,
+                tile: int, tiles_x: int,
+                start: wp.array(dtype=wp.int32),
+                fill: wp.array(dtype=wp.int32),
+                items: wp.array(dtype=wp.int32),
+                scatter: int,
+                dirty: wp.array(dtype=wp.int32)):
+    # pass 1 (scatter=0): count impacts per tile; pass 2: write bin entries
+    i = wp.tid()
+    h = hits[i]
+    c = hit_texel(h[0], h[1], wall_x0, wall_w, wall_h, tw, th)
+    if scatter == 0:
+        mark_dirty(c[0], c[1], radx, radz, tw, th, dirty)
+    x0 = wp.max(c[0] - radx, 0) // tile
+    x1 = wp.min(c[0] + radx, tw - 1) // tile
+    y0 = wp.max(c[1] - radz, 0) // tile
+    y1 = wp.min(c[1] + radz, th - 1) // tile
+    for ty in range(y0, y1 + 1):
+        for tx in range(x0, x1 + 1):
+            b = ty * tiles_x + tx
+            k = wp.atomic_add(fill, b, 1)
+            if scatter != 0:
+                items[start[b] + k] = i
 
-def gaussian_blur_both():
-    if W_LEN == 1:  # no-op
+@wp.kernel
+def tile_accumulate(hits: wp.array(dtype=wp.vec3f),
+                    active: wp.array(dtype=wp.int32),
+                    start: wp.array(dtype=wp.int32),
+                    count: wp.array(dtype=wp.int32),
+                    items: wp.array(dtype=wp.int32),
+                    wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                    tw: int, th: int, radx: int, radz: int,
+                    stamp: wp.array(dtype=wp.float32),
+                    base_inten: wp.float32,
+                    tile: int, tiles_x: int,
+                    page: wp.array(dtype=wp.int32), paged: int,
+                    acc: wp.array(dtype=Any),
+                    fr:  wp.array(dtype=Any),
+                    cover_thr: wp.float32, cover: wp.array(dtype=wp.int32)):
+    # paged != 0: acc / fr are tile pools and page[b] is tile b's slot
+    tid = wp.tid()
+    b = active[tid // (tile * tile)]
+    local = tid % (tile * tile)
+    x = (b % tiles_x) * tile + local % tile
+    y = (b // tiles_x) * tile + local // tile
+    if x >= tw or y >= th:
+        return
+
+    sw = 2 * radx + 1
+    s = wp.float32(0.0)
+    for k in range(start[b], start[b] + count[b]):
+        h = hits[items[k]]
+        c = hit_texel(h[0], h[1], wall_x0, wall_w, wall_h, tw, th)
+        dx = x - c[0]
+        dy = y - c[1]
+        if dx < -radx or dx > radx or dy < -radz or dy > radz:
+            continue
+        s += base_inten * h[2] * stamp[(dy + radz) * sw + dx + radx]
+
+    # accumulated and fresh written together, this thread owns the pixel
+    if s > 0.0:
+        p = y * tw + x
+        if paged != 0:
+            p = page[b] * tile * tile + local
+        old = texel_load(acc, p)
+        new = texel_round(acc, old + s)
+        texel_store(acc, p, new)
+        texel_store(fr, p, texel_load(fr, p) + s)
+        track_cover(old, new, cover_thr, y, cover)
+
+# ---- tiled surface ----
+# TiledPaintSurface keeps texels in a pool of tile x tile pages; page[t] is
+# the pool slot of tile t, or -1 while the tile holds no paint (reads as 0).
+# slot_tile[s] maps back from slot to tile.  Kernels run one thread per
+# texel of the allocated slots.
+
+@wp.func
+def paged_read(pool: wp.array(dtype=wp.float32), page: wp.array(dtype=wp.int32),
+               x: int, y: int, tile: int, tiles_x: int):
+    s = page[(y // tile) * tiles_x + x // tile]
+    if s < 0:
+        return wp.float32(0.0)
+    return pool[(s * tile + y % tile) * tile + x % tile]
+
+@wp.func
+def slot_texel(tid: int, slot_tile: wp.array(dtype=wp.int32), tile: int, tiles_x: int):
+    b = slot_tile[tid // (tile * tile)]
+    local = tid % (tile * tile)
+    return wp.vec2i((b % tiles_x) * tile + local % tile,
+                    (b // tiles_x) * tile + local // tile)
+
+@wp.kernel
+def paged_halo(acc: wp.array(dtype=wp.float32), fr: wp.array(dtype=wp.float32),
+               slot_tile: wp.array(dtype=wp.int32), page: wp.array(dtype=wp.int32),
+               tile: int, tiles_x: int, w: int, h: int, radius: int, eps: wp.float32,
+               need: wp.array(dtype=wp.int32), n_need: wp.array(dtype=wp.int32)):
+    # flag missing tiles the blur of a texel above eps would reach
+    tid = wp.tid()
+    c = slot_texel(tid, slot_tile, tile, tiles_x)
+    if c[0] >= w or c[1] >= h:
+        return
+    if wp.max(acc[tid], fr[tid]) <= eps:
+        return
+    x0 = wp.max(c[0] - radius, 0) // tile
+    x1 = wp.min(c[0] + radius, w - 1) // tile
+    y0 = wp.max(c[1] - radius, 0) // tile
+    y1 = wp.min(c[1] + radius, h - 1) // tile
+    for ty in range(y0, y1 + 1):
+        for tx in range(x0, x1 + 1):
+            t = ty * tiles_x + tx
+            if page[t] < 0:
+                need[t] = 1
+                wp.atomic_add(n_need, 0, 1)
+
+@wp.kernel
+def paged_blur_h_both(acc: wp.array(dtype=wp.float32), fr: wp.array(dtype=wp.float32),
+                      tmp_acc: wp.array(dtype=wp.float32), tmp_fr: wp.array(dtype=wp.float32),
+                      slot_tile: wp.array(dtype=wp.int32), page: wp.array(dtype=wp.int32),
+                      tile: int, tiles_x: int, w: int, h: int, radius: int,
+                      weights: wp.array(dtype=wp.float32), wlen: int):
+    tid = wp.tid()
+    c = slot_texel(tid, slot_tile, tile, tiles_x)
+    if c[0] >= w or c[1] >= h:
+        return
+    sa = wp.float32(0.0)
+    sf = wp.float32(0.0)
+    for k in range(wlen):
+        xx = c[0] + k - radius
+        if xx < 0: xx = 0
+        elif xx >= w: xx = w - 1
+        wk = weights[k]
+        sa += paged_read(acc, page, xx, c[1], tile, tiles_x) * wk
+        sf += paged_read(fr, page, xx, c[1], tile, tiles_x) * wk
+    tmp_acc[tid] = sa
+    tmp_fr[tid] = sf
+
+@wp.kernel
+def paged_blur_v_decay_clamp(tmp_acc: wp.array(dtype=wp.float32), tmp_fr: wp.array(dtype=wp.float32),
+                             acc: wp.array(dtype=wp.float32), fr: wp.array(dtype=wp.float32),
+                             slot_tile: wp.array(dtype=wp.int32), page: wp.array(dtype=wp.int32),
+                             tile: int, tiles_x: int, w: int, h: int, radius: int,
+                             weights: wp.array(dtype=wp.float32), wlen: int,
+                             f: wp.float32, clamp: int,
+                             cover_thr: wp.float32, cover: wp.array(dtype=wp.int32)):
+    # clamp == 0: blur only (gaussian_blur_both), f is then 1
+    tid = wp.tid()
+    c = slot_texel(tid, slot_tile, tile, tiles_x)
+    if c[0] >= w or c[1] >= h:
         return
-    tmp = wp.zeros_like(_tex_accum)
-    wp.launch(blur_h, dim=N, device=device, inputs=[_tex_accum, tmp, W, H, _radius, _w, W_LEN])
-    wp.launch(blur_v, dim=N, device=device, inputs=[tmp, _tex_accum, W, H, _radius, _w, W_LEN])
-    wp.launch(blur_h, dim=N, device=device, inputs=[_tex_fresh, tmp, W, H, _radius, _w, W_LEN])
-    wp.launch(blur_v, dim=N, device=device, inputs=[tmp, _tex_fresh, W, H, _radius, _w, W_LEN])
+    sa = wp.float32(0.0)
+    sf = wp.float32(0.0)
+    for k in range(wlen):
+        yy = c[1] + k - radius
+        if yy < 0: yy = 0
+        elif yy >= h: yy = h - 1
+        wk = weights[k]
+        sa += paged_read(tmp_acc, page, c[0], yy, tile, tiles_x) * wk
+        sf += paged_read(tmp_fr, page, c[0], yy, tile, tiles_x) * wk
+    new = sa
+    nf = sf * f
+    if clamp != 0:
+        new = wp.clamp(new, 0.0, 1.0)
+        nf = wp.clamp(nf, 0.0, 1.0)
+    track_cover(acc[tid], new, cover_thr, c[1], cover)
+    acc[tid] = new
+    fr[tid] = nf
 
-def decay_fresh():
-    wp.launch(decay, dim=N, device=device, inputs=[_tex_fresh, np.float32(FRESH_DECAY)])
+# ---- storage overloads ----
+# Every (accum, fresh) storage pair layer_dtypes() allows is declared here,
+# so the module is built once.  An overload first seen at launch would
+# rebuild it and invalidate the launches already recorded (record_cmd).
 
-def clamp_both():
-    wp.launch(clamp01, dim=N, device=device, inputs=[_tex_accum])
-    wp.launch(clamp01, dim=N, device=device, inputs=[_tex_fresh])
+for _t in STORAGE_DTYPES.values():
+    _T = wp.array(dtype=_t)
+    wp.overload(blur_h, {"src": _T, "dst": _T})
+    wp.overload(blur_v, {"src": _T, "dst": _T})
+    wp.overload(clamp01, {"tex": _T})
+    wp.overload(decay, {"tex": _T})
+    wp.overload(reduce_block, {"acc": _T})
+    wp.overload(count_cover, {"acc": _T})
+for _a, _f in ((wp.float32, wp.float32), (wp.float32, wp.float16), (wp.float32, wp.uint16),
+               (wp.uint16, wp.uint16)):
+    _A, _F = wp.array(dtype=_a), wp.array(dtype=_f)
+    wp.overload(blur_h_both, {"acc": _A, "fr": _F, "tmp_acc": _A, "tmp_fr": _F})
+    wp.overload(blur_v_decay_clamp, {"tmp_acc": _A, "tmp_fr": _F, "acc": _A, "fr": _F})
+    wp.overload(decay_clamp, {"acc": _A, "fr": _F})
+    wp.overload(tile_accumulate, {"acc": _A, "fr": _F})
 
-def download_rgb():
-    """Blend red paint over a chosen background (gray/white/black)."""
-    from .config import PNG_BG_MODE, PNG_BG_GRAY
-    acc = _tex_accum.numpy().astype(np.float32).reshape(H, W)
+# ---- host side ----
+
+# ---- host-side colour mapping ----
+
+def accum_to_rgb(acc, cfg=config):
+    """Blend red paint over a chosen background (gray/white/black).
+
+    acc is an (H, W) float array; returns uint8 (r, g, b) planes.
+    """
+    c = cfg
+    acc = np.asarray(acc, dtype=np.float32)
 
     # density scaling
-    dens = (float(EMIT_PER_STEP) / max(1.0, float(REF_EMIT_PER_STEP))) ** float(COLOR_DENSITY_EXP)
-    acc = np.clip(acc * np.float32(VIS_GAIN) * np.float32(dens), 0.0, 1.0)
+    dens = (float(c.EMIT_PER_STEP) / max(1.0, float(c.REF_EMIT_PER_STEP))) ** float(c.COLOR_DENSITY_EXP)
+    acc = np.clip(acc * np.float32(c.VIS_GAIN) * np.float32(dens), 0.0, 1.0)
 
     # background RGB in [0,1]
-    if PNG_BG_MODE == "white":
+    if c.PNG_BG_MODE == "white":
         bg = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-    elif PNG_BG_MODE == "black":
+    elif c.PNG_BG_MODE == "black":
         bg = np.array([0.0, 0.0, 0.0], dtype=np.float32)
     else:  # gray
-        g = np.float32(PNG_BG_GRAY)
+        g = np.float32(c.PNG_BG_GRAY)
         bg = np.array([g, g, g], dtype=np.float32)
 
     # paint color is pure red
@@ -132,10 +574,617 @@ def download_rgb():
     r8, g8, b8 = out[..., 0], out[..., 1], out[..., 2]
     return r8, g8, b8
 
+# ---- metrics ----
+
+def _metric_launches(acc, n, cfg, paged, slot_tile, tile, tiles_x, w, h,
+                     partials, stats, record=False):
+    n_blocks = max(1, (n + REDUCE_BLOCK - 1) // REDUCE_BLOCK)
+    return [
+        wp.launch(reduce_block, dim=n_blocks, device=acc.device, record_cmd=record,
+                  inputs=[acc, n, REDUCE_BLOCK, float(cfg.COVER_THRESH),
+                          float(cfg.UNDER_THRESH), float(cfg.OVER_THRESH),
+                          paged, slot_tile, tile, tiles_x, w, h, partials]),
+        wp.launch(reduce_partials, dim=N_STATS, device=acc.device, record_cmd=record,
+                  inputs=[partials, n_blocks, stats]),
+    ]
+
+def _summarize(stats, n_total, cfg):
+    """Metrics dict from a reduced stats row over n_total texels.
+
+    Texels the reduction did not visit (unallocated tiles) count as 0.
+    """
+    stats = [float(v) for v in stats]
+    missing = n_total - stats[STAT_N]
+    n_cover = stats[STAT_COVER] + (missing if 0.0 >= cfg.COVER_THRESH else 0)
+    n_under = stats[STAT_UNDER] + (missing if 0.0 < cfg.UNDER_THRESH else 0)
+    n_over = stats[STAT_OVER] + (missing if 0.0 >= cfg.OVER_THRESH else 0)
+    lo, hi = stats[STAT_MIN], stats[STAT_MAX]
+    if missing:
+        lo, hi = min(lo, 0.0), max(hi, 0.0)
+    mean = stats[STAT_SUM] / n_total
+    std = math.sqrt(max(stats[STAT_SUM2] / n_total - mean * mean, 0.0))
+    return {
+        "coverage_pct": 100.0 * n_cover / n_total,
+        "mean": mean,
+        "std": std,
+        "cv": std / mean if mean > 0.0 else float("nan"),
+        "min": lo,
+        "max": hi,
+        "under_pct": 100.0 * n_under / n_total,
+        "over_pct": 100.0 * n_over / n_total,
+    }
+
+
+def _bin_hits(surf, hits, n_hits, common):
+    """Bin n_hits impacts into surf's tiles (two bin_impacts passes).
+
+    Leaves per-tile counts in surf._bin_count, offsets in surf._bin_start and
+    the entries in surf._bin_items; returns the counts on the host.
+    """
+    surf._bin_fill.zero_()
+    wp.launch(bin_impacts, dim=n_hits, device=surf.device,
+              inputs=[hits, *common, surf._bin_start, surf._bin_fill, surf._bin_items, 0, surf.dirty])
+    wp.copy(surf._bin_count, surf._bin_fill)
+    wp.utils.array_scan(surf._bin_count, surf._bin_start, inclusive=False)
+
+    counts = surf._bin_count.numpy()
+    total = int(counts.sum())
+    if total > surf._bin_items.shape[0]:
+        surf._bin_items = wp.zeros(max(total, 2 * surf._bin_items.shape[0]),
+                                   dtype=wp.int32, device=surf.device)
+    surf._bin_fill.zero_()
+    wp.launch(bin_impacts, dim=n_hits, device=surf.device,
+              inputs=[hits, *common, surf._bin_start, surf._bin_fill, surf._bin_items, 1, surf.dirty])
+    return counts
+
+
+class PaintSurface:
+    """Accumulated + fresh paint layers of one wall, with their scratch buffers.
+
+    cfg is a config.snapshot() namespace (module defaults when None).  Each
+    layer and its blur scratch are stored as ACCUM_DTYPE / FRESH_DTYPE (see
+    texel storage); with 16-bit storage deposition is always binned.
+    """
+
+    hits_only = False   # the per-particle atomic splat can write into it
+
+    def __init__(self, cfg=None, device=device):
+        wp.init()
+        self.cfg = cfg = cfg if cfg is not None else config.snapshot()
+        self.device = device
+
+        self.W, self.H = texture_size(cfg)
+        self.N = self.W * self.H
+
+        acc_t, fr_t = layer_dtypes(cfg)
+        # no 16-bit atomics in the particle kernels: those splat into _no_splat
+        # and deposit_binned() writes the layers
+        self.hits_only = acc_t is not wp.float32 or fr_t is not wp.float32
+        self._no_splat = wp.zeros(1, dtype=wp.float32, device=device)
+
+        self.accum = wp.zeros(self.N, dtype=acc_t, device=device)  # accumulated
+        self.fresh = wp.zeros(self.N, dtype=fr_t, device=device)   # per-step
+
+        self.radius, weights = _gauss_weights(blur_sigma_pix(cfg))
+        self.weights = wp.from_numpy(weights, dtype=wp.float32, device=device)
+        self.wlen = int(weights.shape[0])
+
+        # scratch for post_step, allocated once
+        self._tmp_accum = wp.zeros(self.N, dtype=acc_t, device=device)
+        self._tmp_fresh = wp.zeros(self.N, dtype=fr_t, device=device)
+        self._post_cmds = None
+
+        self._dirty_empty = wp.array(np.array([self.W, self.H, -1, -1], dtype=np.int32),
+                                     dtype=wp.int32, device=device)
+        self.dirty = wp.clone(self._dirty_empty)
+        if cfg.FRESH_DECAY >= 1.0:
+            self.dirty_keep = 0     # fresh never decays: keep everything painted so far
+        elif cfg.FRESH_DECAY <= 0.0:
+            self.dirty_keep = 1
+        else:
+            self.dirty_keep = max(1, math.ceil(math.log(cfg.DIRTY_FRESH_EPS) / math.log(cfg.FRESH_DECAY)))
+        self._dirty_history = collections.deque()   # (frame, box), oldest first
+        self._dirty_frame = 0
+
+        self.tile = int(cfg.DEPOSIT_TILE)
+        self.tiles_x = (self.W + self.tile - 1) // self.tile
+        self.tiles_y = (self.H + self.tile - 1) // self.tile
+        n_tiles = self.tiles_x * self.tiles_y
+        self._bin_count = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_start = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_fill  = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_items = wp.zeros(1024,    dtype=wp.int32, device=device)
+        self._no_page   = wp.zeros(1,       dtype=wp.int32, device=device)
+
+        # metrics reduction buffers, launches recorded on first use
+        self._partials = wp.zeros(((self.N + REDUCE_BLOCK - 1) // REDUCE_BLOCK, N_STATS),
+                                  dtype=wp.float64, device=device)
+        self._stats = wp.zeros(N_STATS, dtype=wp.float64, device=device)
+        self._metric_cmds = None
+
+        # covered texels, total and per row (see track_cover)
+        self.cover = wp.zeros(self.H + 1, dtype=wp.int32, device=device)
+        self._cover_thr = float(cfg.COVER_THRESH)
+
+    def close(self):
+        """Drop all device buffers now instead of at garbage collection."""
+        for k, v in list(vars(self).items()):
+            if isinstance(v, wp.array):
+                setattr(self, k, None)
+        self._post_cmds = None
+        self._metric_cmds = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_accum(self): return self.accum
+    def get_fresh(self): return self.fresh
+    def get_dirty(self): return self.dirty
+
+    def splat_targets(self):
+        """(accum, fresh, dirty, cover) for the atomic splat in the particle kernels
+        (placeholders for the layers when hits_only)."""
+        if self.hits_only:
+            return self._no_splat, self._no_splat, self.dirty, self.cover
+        return self.accum, self.fresh, self.dirty, self.cover
+
+    @property
+    def allocated_bytes(self):
+        """Bytes held by both layers and their blur scratch."""
+        return sum(a.capacity for a in (self.accum, self.fresh, self._tmp_accum, self._tmp_fresh))
+
+    def clear_mask(self):
+        self.accum.zero_()
+        self.fresh.zero_()
+        self.cover.zero_()
+        wp.copy(self.dirty, self._dirty_empty)
+        self._dirty_history.clear()
+        self._dirty_frame = 0
+
+    # ---- binned deposition ----
+
+    def deposit_binned(self, hits, n_hits: int, stamp, radx: int, radz: int, base_inten: float):
+        """Splat n_hits buffered impacts into both layers without texture atomics."""
+        if n_hits <= 0:
+            return
+        c = self.cfg
+        tile = self.tile
+        common = [float(c.WALL_OFFSET_X), float(c.WALL_W), float(c.WALL_H),
+                  self.W, self.H, int(radx), int(radz), tile, self.tiles_x]
+
+        counts = _bin_hits(self, hits, n_hits, common)
+        active = np.flatnonzero(counts).astype(np.int32)
+        if active.size == 0:
+            return
+        wp.launch(tile_accumulate, dim=int(active.size) * tile * tile, device=self.device,
+                  inputs=[hits, wp.from_numpy(active, dtype=wp.int32, device=self.device),
+                          self._bin_start, self._bin_count, self._bin_items,
+                          *common[:7], stamp, float(base_inten), tile, self.tiles_x,
+                          self._no_page, 0, self.accum, self.fresh, self._cover_thr, self.cover])
+
+    # ---- per-frame effects ----
+
+    def gaussian_blur_both(self):
+        if self.wlen == 1:  # no-op
+            return
+        W, H, N = self.W, self.H, self.N
+        args = [W, H, self.radius, self.weights, self.wlen]
+        for layer, tmp in ((self.accum, self._tmp_accum), (self.fresh, self._tmp_fresh)):
+            wp.launch(blur_h, dim=N, device=self.device, inputs=[layer, tmp, *args])
+            wp.launch(blur_v, dim=N, device=self.device, inputs=[tmp, layer, *args])
+        self._recount_cover()
+
+    def post_step(self):
+        """Same result as gaussian_blur_both(); decay_fresh(); clamp_both(),
+        in two full-texture passes (one when blur is disabled).
+
+        With DIRTY_REGION the passes are restricted to the recently painted
+        region; paint outside it is left as it was (no further diffusion).
+        """
+        f = float(self.cfg.FRESH_DECAY)
+        if not self.cfg.DIRTY_REGION:
+            # full texture: same launches every frame, replay them
+            if self._post_cmds is None:
+                self._post_cmds = self._post_step_launches(f, 0, 0, self.W - 1, self.H - 1, record=True)
+            for cmd in self._post_cmds:
+                cmd.launch()
+            return
+
+        region = self._take_dirty_region()
+        if region is None:
+            return
+        self._post_step_launches(f, *region)
+
+    def _post_step_launches(self, f, x0, y0, x1, y1, record=False):
+        W, H, r = self.W, self.H, self.radius
+        rw = x1 - x0 + 1
+        rh = y1 - y0 + 1
+        if self.wlen == 1:
+            return [wp.launch(decay_clamp, dim=rw*rh, device=self.device, record_cmd=record,
+                              inputs=[self.accum, self.fresh, f, W, x0, y0, rw])]
+        # the vertical pass reads r rows above/below the region
+        hy0 = max(0, y0 - r)
+        hy1 = min(H - 1, y1 + r)
+        blur = [W, H, r, self.weights, self.wlen]
+        return [
+            wp.launch(blur_h_both, dim=rw*(hy1 - hy0 + 1), device=self.device, record_cmd=record,
+                      inputs=[self.accum, self.fresh, self._tmp_accum, self._tmp_fresh, *blur,
+                              x0, hy0, rw]),
+            wp.launch(blur_v_decay_clamp, dim=rw*rh, device=self.device, record_cmd=record,
+                      inputs=[self._tmp_accum, self._tmp_fresh, self.accum, self.fresh, *blur, f,
+                              x0, y0, rw, self._cover_thr, self.cover]),
+        ]
+
+    def _take_dirty_region(self):
+        """Region for this frame's post-step as (x0, y0, x1, y1), or None."""
+        box = self.dirty.numpy().copy()
+        wp.copy(self.dirty, self._dirty_empty)
+        self._dirty_frame += 1
+        hist = self._dirty_history
+        if box[2] >= box[0]:
+            if self.dirty_keep == 0 and hist:
+                # fresh never decays: one running union of everything painted
+                _, u = hist.pop()
+                box = np.concatenate([np.minimum(u[:2], box[:2]), np.maximum(u[2:], box[2:])])
+            hist.append((self._dirty_frame, box))
+        # boxes age by frame, whether or not anything was painted since
+        while self.dirty_keep and hist and hist[0][0] <= self._dirty_frame - self.dirty_keep:
+            hist.popleft()
+        if not hist:
+            return None
+        r = self.radius
+        x0 = min(int(b[0]) for _, b in hist) - r
+        y0 = min(int(b[1]) for _, b in hist) - r
+        x1 = max(int(b[2]) for _, b in hist) + r
+        y1 = max(int(b[3]) for _, b in hist) + r
+        return max(x0, 0), max(y0, 0), min(x1, self.W - 1), min(y1, self.H - 1)
+
+    def decay_fresh(self):
+        wp.launch(decay, dim=self.N, device=self.device,
+                  inputs=[self.fresh, float(self.cfg.FRESH_DECAY)])
+
+    def clamp_both(self):
+        wp.launch(clamp01, dim=self.N, device=self.device, inputs=[self.accum])
+        wp.launch(clamp01, dim=self.N, device=self.device, inputs=[self.fresh])
+        self._recount_cover()
+
+    def _recount_cover(self):
+        # the unfused passes above do not track threshold crossings
+        self.cover.zero_()
+        wp.launch(count_cover, dim=self.N, device=self.device,
+                  inputs=[self.accum, self.W, self._cover_thr, self.cover])
+
+    # ---- readback ----
+
+    def accum_numpy(self):
+        """Host copy of accum as an (H, W) float32 array."""
+        return decode_texels(self.accum.numpy()).reshape(self.H, self.W).copy()
+
+    def download_rgb(self):
+        """Blend red paint over a chosen background (gray/white/black)."""
+        return accum_to_rgb(decode_texels(self.accum.numpy()).reshape(self.H, self.W), self.cfg)
+
+    def download_accum(self, out):
+        """Copy accum into out, a host (device "cpu") wp.array of N floats."""
+        if self.accum.dtype is wp.float32:
+            wp.copy(out, self.accum)
+        else:
+            out.numpy()[:] = decode_texels(self.accum.numpy())   # 16-bit transfer, decoded on the host
+        return out
+
+    def metrics(self):
+        """Coverage and uniformity of the accumulated paint, in one reduction
+        pass; these are also the metric columns of a sweep.
+
+        coverage_pct: texels at or above COVER_THRESH; under_pct / over_pct:
+        texels below UNDER_THRESH / at or above OVER_THRESH; mean / std /
+        min / max of accum; cv: std / mean (lower is more even).
+        """
+        if self._metric_cmds is None:
+            self._metric_cmds = _metric_launches(
+                self.accum, self.N, self.cfg, 0, self._no_page, 1, 1, self.W, self.H,
+                self._partials, self._stats, record=True)
+        for cmd in self._metric_cmds:
+            cmd.launch()
+        return _summarize(self._stats.numpy(), self.N, self.cfg)
+
+    def coverage_percent(self):
+        """Texels >= COVER_THRESH in percent, from the running counter (no texture pass)."""
+        return 100.0 * float(self.cover.numpy()[0]) / float(self.N)
+
+    def row_coverage(self):
+        """Covered fraction of every texture row (top row first), shape (H,)."""
+        return self.cover.numpy()[1:].astype(np.float64) / float(self.W)
+
+
+class TiledPaintSurface:
+    """Paint layers of a large wall, stored as tiles allocated where paint lands.
+
+    The texture is W x H as texture_size() gives it (for a large wall, set
+    TEXTURE_MM_PER_PIX so it follows the wall size).  It is split into PAINT_TILE x PAINT_TILE tiles; a tile takes
+    memory once a splat touches it, or once blur from a neighbour would
+    carry more than PAINT_TILE_EPS into it.  Missing tiles read as 0.
+
+    Same interface as PaintSurface, except that get_accum() / get_fresh()
+    return dense copies gathered from the tiles (writes to them are not
+    seen by the surface).  Deposition is always binned (hits_only): the
+    particle kernels buffer impacts and deposit_binned() splats them.
+    """
+
+    hits_only = True
+
+    def __init__(self, cfg=None, device=device):
+        wp.init()
+        self.cfg = cfg = cfg if cfg is not None else config.snapshot()
+        self.device = device
+
+        if cfg.ACCUM_DTYPE != "float32" or cfg.FRESH_DTYPE != "float32":
+            raise ValueError("ACCUM_DTYPE / FRESH_DTYPE other than float32 need PAINT_SURFACE='dense'")
+        self.W, self.H = texture_size(cfg)
+        self.N = self.W * self.H
+
+        self.tile = int(cfg.PAINT_TILE)
+        self.tiles_x = (self.W + self.tile - 1) // self.tile
+        self.tiles_y = (self.H + self.tile - 1) // self.tile
+        n_tiles = self.tiles_x * self.tiles_y
+
+        self.radius, weights = _gauss_weights(blur_sigma_pix(cfg))
+        self.weights = wp.from_numpy(weights, dtype=wp.float32, device=device)
+        self.wlen = int(weights.shape[0])
+
+        # page table (tile -> slot) and its inverse, mirrored on the host
+        self._page = np.full(n_tiles, -1, dtype=np.int32)
+        self._slot_tile = np.zeros(0, dtype=np.int32)
+        self.page = wp.from_numpy(self._page, dtype=wp.int32, device=device)
+        self.slot_tile = wp.zeros(1, dtype=wp.int32, device=device)
+        self.n_slots = 0
+        self.capacity = 0
+        self.pool_accum = self.pool_fresh = None
+        self._tmp_accum = self._tmp_fresh = self._partials = None
+        self._grow(16)
+
+        self._stats  = wp.zeros(N_STATS, dtype=wp.float64, device=device)
+        self._need   = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._n_need = wp.zeros(1,       dtype=wp.int32, device=device)
+
+        self._bin_count = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_start = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_fill  = wp.zeros(n_tiles, dtype=wp.int32, device=device)
+        self._bin_items = wp.zeros(1024,    dtype=wp.int32, device=device)
+        # bin_impacts also grows a dirty box; unused here
+        self.dirty = wp.array(np.array([self.W, self.H, -1, -1], dtype=np.int32),
+                              dtype=wp.int32, device=device)
+        self._no_splat = wp.zeros(1, dtype=wp.float32, device=device)
+
+        # covered texels, total and per row (see track_cover)
+        self.cover = wp.zeros(self.H + 1, dtype=wp.int32, device=device)
+        self._cover_thr = float(cfg.COVER_THRESH)
+
+    def close(self):
+        """Drop all device buffers now instead of at garbage collection."""
+        for k, v in list(vars(self).items()):
+            if isinstance(v, wp.array):
+                setattr(self, k, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_accum(self): return self._gather(self.pool_accum)
+    def get_fresh(self): return self._gather(self.pool_fresh)
+    def get_dirty(self): return self.dirty
+
+    def _gather(self, pool):
+        """Dense N-texel copy of a layer (missing tiles are 0)."""
+        return wp.from_numpy(self._assemble(pool).ravel(), dtype=wp.float32, device=self.device)
+
+    def splat_targets(self):
+        """Placeholders for the particle kernels' atomic splat (never written:
+        the tiled surface is hits_only)."""
+        return self._no_splat, self._no_splat, self.dirty, self.cover
+
+    def clear_mask(self):
+        """Release every tile."""
+        self._page[:] = -1
+        self._slot_tile = self._slot_tile[:0]
+        self.page = wp.from_numpy(self._page, dtype=wp.int32, device=self.device)
+        self.n_slots = 0
+        self.pool_accum.zero_()
+        self.pool_fresh.zero_()
+        self.cover.zero_()
+
+    # ---- tile allocation ----
+
+    def _grow(self, capacity):
+        """Resize the pools to hold capacity tiles, keeping the allocated ones."""
+        n = self.tile * self.tile
+        used = self.n_slots * n
+        pools = []
+        for old in (self.pool_accum, self.pool_fresh):
+            new = wp.zeros(capacity * n, dtype=wp.float32, device=self.device)
+            if used:
+                wp.copy(new, old, count=used)
+            pools.append(new)
+        self.pool_accum, self.pool_fresh = pools
+        self._tmp_accum = wp.zeros(capacity * n, dtype=wp.float32, device=self.device)
+        self._tmp_fresh = wp.zeros(capacity * n, dtype=wp.float32, device=self.device)
+        self._partials = wp.zeros(((capacity * n + REDUCE_BLOCK - 1) // REDUCE_BLOCK, N_STATS),
+                                  dtype=wp.float64, device=self.device)
+        self.capacity = capacity
+
+    def _allocate(self, tiles):
+        """Give every tile in tiles that has none a (zeroed) slot."""
+        tiles = np.unique(np.asarray(tiles, dtype=np.int32))
+        tiles = tiles[self._page[tiles] < 0]
+        if tiles.size == 0:
+            return
+        need = self.n_slots + int(tiles.size)
+        if need > self.capacity:
+            self._grow(max(need, 2 * self.capacity))
+        self._page[tiles] = np.arange(self.n_slots, need, dtype=np.int32)
+        self._slot_tile = np.concatenate([self._slot_tile, tiles])
+        self.n_slots = need
+        self.page = wp.from_numpy(self._page, dtype=wp.int32, device=self.device)
+        self.slot_tile = wp.from_numpy(self._slot_tile, dtype=wp.int32, device=self.device)
+
+    @property
+    def allocated_bytes(self):
+        """Bytes held by the tile pools (both layers and their blur scratch)."""
+        return 4 * 4 * self.capacity * self.tile * self.tile
+
+    # ---- binned deposition ----
+
+    def deposit_binned(self, hits, n_hits: int, stamp, radx: int, radz: int, base_inten: float):
+        """Splat n_hits buffered impacts, allocating the tiles they touch."""
+        if n_hits <= 0:
+            return
+        c = self.cfg
+        tile = self.tile
+        common = [float(c.WALL_OFFSET_X), float(c.WALL_W), float(c.WALL_H),
+                  self.W, self.H, int(radx), int(radz), tile, self.tiles_x]
+        counts = _bin_hits(self, hits, n_hits, common)
+        active = np.flatnonzero(counts).astype(np.int32)
+        if active.size == 0:
+            return
+        self._allocate(active)
+        wp.launch(tile_accumulate, dim=int(active.size) * tile * tile, device=self.device,
+                  inputs=[hits, wp.from_numpy(active, dtype=wp.int32, device=self.device),
+                          self._bin_start, self._bin_count, self._bin_items,
+                          *common[:7], stamp, float(base_inten), tile, self.tiles_x,
+                          self.page, 1, self.pool_accum, self.pool_fresh, self._cover_thr, self.cover])
+
+    # ---- per-frame effects ----
+
+    def gaussian_blur_both(self):
+        if self.wlen == 1 or self.n_slots == 0:
+            return
+        self._paged_blur(1.0, 0)
+
+    def post_step(self):
+        """Blur both layers, decay fresh and clamp, over the allocated tiles.
+
+        Tiles the blur would spread more than PAINT_TILE_EPS into are
+        allocated first; smaller amounts are dropped at the tile border.
+        """
+        if self.n_slots == 0:
+            return
+        f = float(self.cfg.FRESH_DECAY)
+        if self.wlen == 1:
+            used = self.n_slots * self.tile * self.tile
+            wp.launch(decay_clamp, dim=used, device=self.device,
+                      inputs=[self.pool_accum, self.pool_fresh, f, used, 0, 0, used])
+            return
+        self._paged_blur(f, 1)
+
+    def decay_fresh(self):
+        wp.launch(decay, dim=self.n_slots * self.tile * self.tile, device=self.device,
+                  inputs=[self.pool_fresh, float(self.cfg.FRESH_DECAY)])
+
+    def clamp_both(self):
+        # a clamp to [0, 1] cannot cross COVER_THRESH, the counter stays valid
+        for pool in (self.pool_accum, self.pool_fresh):
+            wp.launch(clamp01, dim=self.n_slots * self.tile * self.tile, device=self.device,
+                      inputs=[pool])
+
+    def _paged_blur(self, f, clamp):
+        """Allocate the tiles the blur reaches, then blur both layers (fresh
+        scaled by f; both clamped to [0, 1] when clamp)."""
+        n = self.tile * self.tile
+        grid = [self.slot_tile, self.page, self.tile, self.tiles_x, self.W, self.H, self.radius]
+        self._need.zero_()
+        self._n_need.zero_()
+        wp.launch(paged_halo, dim=self.n_slots * n, device=self.device,
+                  inputs=[self.pool_accum, self.pool_fresh, *grid,
+                          np.float32(self.cfg.PAINT_TILE_EPS), self._need, self._n_need])
+        if int(self._n_need.numpy()[0]) > 0:
+            self._allocate(np.flatnonzero(self._need.numpy()))
+
+        grid = [self.slot_tile, self.page, self.tile, self.tiles_x, self.W, self.H, self.radius,
+                self.weights, self.wlen]
+        wp.launch(paged_blur_h_both, dim=self.n_slots * n, device=self.device,
+                  inputs=[self.pool_accum, self.pool_fresh, self._tmp_accum, self._tmp_fresh, *grid])
+        wp.launch(paged_blur_v_decay_clamp, dim=self.n_slots * n, device=self.device,
+                  inputs=[self._tmp_accum, self._tmp_fresh, self.pool_accum, self.pool_fresh,
+                          *grid, f, int(clamp), self._cover_thr, self.cover])
+
+    # ---- readback ----
+
+    def _assemble(self, pool):
+        tile = self.tile
+        out = np.zeros((self.tiles_y * tile, self.tiles_x * tile), dtype=np.float32)
+        if self.n_slots:
+            blocks = pool.numpy()[:self.n_slots * tile * tile].reshape(-1, tile, tile)
+            view = out.reshape(self.tiles_y, tile, self.tiles_x, tile).swapaxes(1, 2)
+            view[self._slot_tile // self.tiles_x, self._slot_tile % self.tiles_x] = blocks
+        return out[:self.H, :self.W]
+
+    def accum_numpy(self):
+        """Host copy of accum as an (H, W) float32 array (missing tiles are 0)."""
+        return self._assemble(self.pool_accum)
+
+    def download_rgb(self):
+        """Blend red paint over a chosen background (gray/white/black)."""
+        return accum_to_rgb(self.accum_numpy(), self.cfg)
+
+    def download_accum(self, out):
+        """Copy accum into out, a host (device "cpu") wp.array of N floats."""
+        out.numpy()[:] = self.accum_numpy().ravel()
+        return out
+
+    def metrics(self):
+        """Same as PaintSurface.metrics(); reduces the allocated tiles only."""
+        if self.n_slots == 0:
+            return _summarize(np.zeros(N_STATS), self.N, self.cfg)
+        _metric_launches(self.pool_accum, self.n_slots * self.tile * self.tile, self.cfg,
+                         1, self.slot_tile, self.tile, self.tiles_x, self.W, self.H,
+                         self._partials, self._stats)
+        return _summarize(self._stats.numpy(), self.N, self.cfg)
+
+    def coverage_percent(self):
+        """Texels >= COVER_THRESH in percent, from the running counter (no texture pass)."""
+        return 100.0 * float(self.cover.numpy()[0]) / float(self.N)
+
+    def row_coverage(self):
+        """Covered fraction of every texture row (top row first), shape (H,)."""
+        return self.cover.numpy()[1:].astype(np.float64) / float(self.W)
+
+
+def make_surface(cfg=None, device=device):
+    """PaintSurface or TiledPaintSurface, as cfg.PAINT_SURFACE selects."""
+    cfg = cfg if cfg is not None else config.snapshot()
+    kinds = {"dense": PaintSurface, "tiled": TiledPaintSurface}
+    if cfg.PAINT_SURFACE not in kinds:
+        raise ValueError(f"PAINT_SURFACE must be one of {sorted(kinds)}, got {cfg.PAINT_SURFACE!r}")
+    return kinds[cfg.PAINT_SURFACE](cfg, device=device)
+
+
+# ---- module-level API on a default surface (created on first use) ----
+
+_default = None
+
+def default_surface():
+    global _default
+    if _default is None:
+        _default = make_surface()
+    return _default
 
+def get_accum(): return default_surface().get_accum()
+def get_fresh(): return default_surface().get_fresh()
+def get_dirty(): return default_surface().get_dirty()
+def clear_mask(): default_surface().clear_mask()
+def gaussian_blur_both(): default_surface().gaussian_blur_both()
+def post_step(): default_surface().post_step()
+def decay_fresh(): default_surface().decay_fresh()
+def clamp_both(): default_surface().clamp_both()
+def download_rgb(): return default_surface().download_rgb()
+def coverage_percent(): return default_surface().coverage_percent()
+def metrics(): return default_surface().metrics()
+def row_coverage(): return default_surface().row_coverage()
 
-def coverage_percent():
-    counter = wp.zeros(1, dtype=int, device=device)
-    wp.launch(coverage_count, dim=N, device=device,
-              inputs=[_tex_accum, np.float32(COVER_THRESH), counter])
-    return 100.0 * counter.numpy()[0] / float(N)
+def deposit_binned(hits, n_hits: int, stamp, radx: int, radz: int, base_inten: float):
+    default_surface().deposit_binned(hits, n_hits, stamp, radx, radz, base_inten)
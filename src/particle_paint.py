@@ -1,35 +1,25 @@
 import math
+import time
+import functools
 import numpy as np
 import warp as wp
 
-from .config import (
-    PARTICLE_CAP, EMIT_PER_STEP, PARTICLE_SPEED,
-    GRAVITY_Y, AIR_DRAG,
-    WALL_W, WALL_H, WALL_OFFSET_X, BRUSH_Y,
-    FAN_WIDTH_DEG, FAN_THICK_DEG, FAN_PROFILE, FAN_POWER, FAN_WEIGHT_POWER,
-    STICK_INTENSITY, TEXTURE_RES,
-    ELLIPSE_RADIUS_PIX, ELLIPSE_ASPECT_X, ELLIPSE_EDGE_POWER,
-)
+from . import config
 from . import paint_surface_warp as psw
+from . import profiling
 
-wp.init()
+# no work on import: Warp starts with the first context (or warm())
 device = "cpu"
 
-cap    = PARTICLE_CAP
-pos    = wp.zeros(cap, dtype=wp.vec3f,   device=device)
-vel    = wp.zeros(cap, dtype=wp.vec3f,   device=device)
-alive  = wp.zeros(cap, dtype=wp.int32,   device=device)
-w_arr  = wp.zeros(cap, dtype=wp.float32, device=device)
+DT = 1.0 / 60.0   # integrator step (s)
 
-_tex_acc = psw.get_accum()
-_tex_fr  = psw.get_fresh()
-
-_rng = np.random.default_rng()
+_rng = np.random.default_rng(config.RUN_SEED)
 
 # ---------------- fan samplers (host) ----------------
+# Reference implementations; the simulation samples on device (sample_fan).
 
-def _sample_triangular(n, a):
-    u = _rng.random(n, dtype=np.float32)
+def _sample_triangular(rng, n, a):
+    u = rng.random(n, dtype=np.float32)
     out = np.empty(n, dtype=np.float32)
     left = u < 0.5
     if np.any(left):
@@ -40,74 +30,334 @@ def _sample_triangular(n, a):
         out[~left] =  a - a * np.sqrt(1.0 - uR, dtype=np.float32)
     return out
 
-def _sample_cosine(n, a, power):
+def _sample_cosine(rng, n, a, power):
     out = np.empty(n, dtype=np.float32)
     c = 0
     while c < n:
-        phi = (_rng.random(n-c, dtype=np.float32) * 2.0 - 1.0) * a
+        phi = (rng.random(n-c, dtype=np.float32) * 2.0 - 1.0) * a
         x = np.abs(phi) / a
-        accept = _rng.random(n-c, dtype=np.float32) <= (np.cos(x * (np.pi*0.5)) ** power)
+        accept = rng.random(n-c, dtype=np.float32) <= (np.cos(x * (np.pi*0.5)) ** power)
         k = int(np.count_nonzero(accept))
         if k > 0:
             out[c:c+k] = phi[accept][:k]
             c += k
     return out
 
-def _fan_angles_and_weights(n):
-    hw = math.radians(FAN_WIDTH_DEG * 0.5)
-    ht = math.radians(FAN_THICK_DEG * 0.5)
-
-    if FAN_PROFILE.lower() == "triangular":
-        phi_h = _sample_triangular(n, hw)
-        base_w = np.maximum(0.0, 1.0 - np.abs(phi_h)/hw, dtype=np.float32) ** np.float32(FAN_WEIGHT_POWER)
-    elif FAN_PROFILE.lower() == "cosine":
-        phi_h = _sample_cosine(n, hw, FAN_POWER)
-        base_w = (np.cos((np.abs(phi_h)/hw) * (np.pi*0.5)) ** np.float32(FAN_POWER)).astype(np.float32, copy=False)
+def _fan_angles_and_weights(n, cfg=config, rng=None):
+    rng = _rng if rng is None else rng
+    hw = math.radians(cfg.FAN_WIDTH_DEG * 0.5)
+    ht = math.radians(cfg.FAN_THICK_DEG * 0.5)
+
+    if cfg.FAN_PROFILE.lower() == "triangular":
+        phi_h = _sample_triangular(rng, n, hw)
+        base_w = np.maximum(0.0, 1.0 - np.abs(phi_h)/hw, dtype=np.float32) ** np.float32(cfg.FAN_WEIGHT_POWER)
+    elif cfg.FAN_PROFILE.lower() == "cosine":
+        phi_h = _sample_cosine(rng, n, hw, cfg.FAN_POWER)
+        base_w = (np.cos((np.abs(phi_h)/hw) * (np.pi*0.5)) ** np.float32(cfg.FAN_POWER)).astype(np.float32, copy=False)
     else:
-        phi_h = (_rng.random(n, dtype=np.float32) * 2.0 - 1.0) * hw
+        phi_h = (rng.random(n, dtype=np.float32) * 2.0 - 1.0) * hw
         base_w = np.ones(n, dtype=np.float32)
 
-    theta_v = (_rng.random(n, dtype=np.float32) * 2.0 - 1.0) * ht
+    theta_v = (rng.random(n, dtype=np.float32) * 2.0 - 1.0) * ht
     return phi_h.astype(np.float32), theta_v.astype(np.float32), base_w.astype(np.float32)
 
+# ---------------- fan samplers (device) ----------------
+
+FAN_TRIANGULAR, FAN_COSINE, FAN_FLAT = 0, 1, 2
+ICDF_LEN = 1024
+
+def _fan_profile_id(profile):
+    return {"triangular": FAN_TRIANGULAR, "cosine": FAN_COSINE}.get(profile.lower(), FAN_FLAT)
+
+def _cosine_icdf(power, n=ICDF_LEN):
+    """Inverse CDF of pdf(x) ~ cos(|x|*pi/2)^power on [-1, 1], tabulated at
+    n evenly spaced quantiles (replaces the host rejection loop)."""
+    xs = np.linspace(-1.0, 1.0, 8 * n + 1)
+    pdf = np.cos(np.abs(xs) * (np.pi * 0.5)) ** power
+    cdf = np.concatenate([[0.0], np.cumsum(0.5 * (pdf[1:] + pdf[:-1]))])
+    cdf /= cdf[-1]
+    return np.interp(np.linspace(0.0, 1.0, n), cdf, xs).astype(np.float32)
+
+@wp.func
+def sample_fan(state: wp.uint32, profile: int,
+               hw: wp.float32, ht: wp.float32,
+               fan_pow: wp.float32, weight_pow: wp.float32,
+               icdf: wp.array(dtype=wp.float32), icdf_len: int):
+    """Returns (phi_h, theta_v, weight) for one particle."""
+    u = wp.randf(state)
+    if profile == 0:
+        # triangular, inverse CDF
+        if u < 0.5:
+            ph = -hw + hw * wp.sqrt(u * 2.0)
+        else:
+            ph = hw - hw * wp.sqrt(2.0 - u * 2.0)
+        w = wp.pow(wp.max(0.0, 1.0 - wp.abs(ph) / hw), weight_pow)
+    elif profile == 1:
+        # cosine^power, tabulated inverse CDF
+        q = u * wp.float32(icdf_len - 1)
+        k = wp.min(wp.int(q), icdf_len - 2)
+        fq = q - wp.float32(k)
+        ph = (icdf[k] + (icdf[k + 1] - icdf[k]) * fq) * hw
+        w = wp.pow(wp.cos((wp.abs(ph) / hw) * (wp.pi * 0.5)), fan_pow)
+    else:
+        ph = (u * 2.0 - 1.0) * hw
+        w = wp.float32(1.0)
+
+    th = (wp.randf(state) * 2.0 - 1.0) * ht
+    return wp.vec3f(ph, th, w)
+
 # ---------------- kernels ----------------
 
+@wp.func
+def fan_velocity(ph: wp.float32, th: wp.float32, speed: wp.float32):
+    dx = wp.tan(ph)
+    dy = wp.float32(-1.0)
+    dz = wp.tan(th)
+
+    inv = wp.float32(1.0) / wp.sqrt(dx*dx + dy*dy + dz*dz)
+    return wp.vec3f(dx * inv * speed, dy * inv * speed, dz * inv * speed)
+
+@wp.func
+def splat_weight(dx: int, dy: int, radx: int, radz: int, edge_pow: wp.float32):
+    # footprint weight of pixel offset (dx, dy) from the impact centre
+    ny = wp.float32(dy) / wp.float32(radz)
+    ny2 = ny * ny
+    nx = wp.float32(dx) / wp.float32(radx)
+
+    # gate by ellipse
+    d2 = nx*nx + ny2
+    if d2 > 1.0:
+        return wp.float32(0.0)
+
+    # explicit triangular across horizontal (nx), elliptical along vertical (ny)
+    ax   = wp.abs(nx)                      # 0..1
+    tri  = wp.pow(1.0 - ax, edge_pow)      # triangular in X
+    velt = 1.0 - ny2                       # elliptical in Z (0..1)
+    if velt <= 0.0:
+        return wp.float32(0.0)
+    vert = wp.pow(velt, edge_pow)
+
+    return tri * vert
+
+@wp.kernel
+def build_splat_stamp(radx: int, radz: int, edge_pow: wp.float32,
+                      stamp: wp.array(dtype=wp.float32)):
+    tid = wp.tid()
+    sw = 2 * radx + 1
+    dx = tid % sw - radx
+    dy = tid // sw - radz
+    stamp[tid] = splat_weight(dx, dy, radx, radz, edge_pow)
+
+@wp.func
+def splat_ellipse(hx: wp.float32, hz: wp.float32, w: wp.float32,
+                  wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                  tw: int, th: int,
+                  radx: int, radz: int,
+                  stamp: wp.array(dtype=wp.float32),
+                  base_inten: wp.float32,
+                  acc: wp.array(dtype=wp.float32),
+                  fr:  wp.array(dtype=wp.float32),
+                  dirty: wp.array(dtype=wp.int32),
+                  cover: wp.array(dtype=wp.int32), cover_thr: wp.float32):
+    if (hx < wall_x0) or (hx > wall_x0 + wall_w) or (hz < 0.0) or (hz > wall_h):
+        return
+
+    u  = (hx - wall_x0) / wall_w
+    vv = hz / wall_h
+
+    fw = wp.float32(tw); fh = wp.float32(th)
+    cx = wp.int(u  * (fw - 1.0))
+    cy = wp.int((1.0 - vv) * (fh - 1.0))
+    psw.mark_dirty(cx, cy, radx, radz, tw, th, dirty)
+
+    inten_base = base_inten * w
+    sw = 2 * radx + 1
+
+    # footprint weights come from the precomputed stamp (see build_splat_stamp)
+    for dy in range(-radz, radz+1):
+        yy = cy + dy
+        if yy < 0 or yy >= th: continue
+        row = (dy + radz) * sw + radx
+
+        for dx in range(-radx, radx+1):
+            xx = cx + dx
+            if xx < 0 or xx >= tw: continue
+            fall = stamp[row + dx]
+            if fall <= 0.0:
+                continue
+
+            inten = inten_base * fall
+
+            idxp = yy * tw + xx
+            old = wp.atomic_add(acc, idxp, inten)
+            wp.atomic_add(fr,  idxp, inten)
+            psw.track_cover(old, old + inten, cover_thr, yy, cover)
+
+@wp.func
+def record_impact(hx: wp.float32, hz: wp.float32, w: wp.float32,
+                  wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                  hits: wp.array(dtype=wp.vec3f),
+                  n_hits: wp.array(dtype=wp.int32)):
+    # binned deposition: buffer the impact, paint_surface_warp splats it later
+    if (hx < wall_x0) or (hx > wall_x0 + wall_w) or (hz < 0.0) or (hz > wall_h):
+        return
+    k = wp.atomic_add(n_hits, 0, 1)
+    hits[k] = wp.vec3f(hx, hz, w)
+
+@wp.func
+def _stepped_y(n: wp.float32, y0: wp.float32, vy0: wp.float32,
+               a: wp.float32, g: wp.float32, drag: wp.float32, dt: wp.float32):
+    # height after n integrator steps (closed form of the recurrence below)
+    if drag > 0.0:
+        c = g / drag
+        return y0 - n * dt * c + (vy0 + c) * (1.0 - wp.pow(a, n)) / drag
+    return y0 + dt * (n * vy0 - g * dt * n * (n + 1.0) * 0.5)
+
+@wp.func
+def _stepped_xz(n: wp.float32, x0: wp.float32, vx0: wp.float32,
+                a: wp.float32, drag: wp.float32, dt: wp.float32):
+    if drag > 0.0:
+        return x0 + vx0 * (1.0 - wp.pow(a, n)) / drag
+    return x0 + vx0 * n * dt
+
+@wp.func
+def analytic_impact(p0: wp.vec3f, v0: wp.vec3f,
+                    g: wp.float32, drag: wp.float32, dt: wp.float32):
+    """Hit point of the stepped integrator, solved at spawn.
+
+    integrate_and_splat_ellipse advances v <- (v - g*dt)/(1 + drag*dt),
+    p <- p + v*dt and interpolates linearly inside the step that crosses
+    y = 0.  That recurrence has a closed form in the step count n, so we
+    Newton-solve y(n) = 0, snap to the crossing step and interpolate the
+    same way.  Returns (hx, hz, steps).
+    """
+    a = wp.float32(1.0) / (wp.float32(1.0) + drag * dt)
+    y0 = p0[1]
+    vy0 = v0[1]
+
+    # straight-line guess, then Newton on the continuous step count
+    n = y0 / wp.max(-vy0 * dt, wp.float32(1.0e-6))
+    for it in range(8):
+        f = _stepped_y(n, y0, vy0, a, g, drag, dt)
+        if drag > 0.0:
+            df = -dt * g / drag - (vy0 + g / drag) * wp.pow(a, n) * wp.log(a) / drag
+        else:
+            df = dt * (vy0 - g * dt * (n + 0.5))
+        if df >= 0.0:
+            break
+        n = n - f / df
+
+    # first whole step with y <= 0
+    k = wp.max(wp.float32(1.0), wp.ceil(n))
+    for it in range(4):
+        if _stepped_y(k, y0, vy0, a, g, drag, dt) > 0.0:
+            k = k + 1.0
+    for it in range(4):
+        if k > 1.0 and _stepped_y(k - 1.0, y0, vy0, a, g, drag, dt) <= 0.0:
+            k = k - 1.0
+
+    ya = _stepped_y(k - 1.0, y0, vy0, a, g, drag, dt)
+    yb = _stepped_y(k, y0, vy0, a, g, drag, dt)
+    t = ya / (ya - yb)
+    xa = _stepped_xz(k - 1.0, p0[0], v0[0], a, drag, dt)
+    xb = _stepped_xz(k, p0[0], v0[0], a, drag, dt)
+    za = _stepped_xz(k - 1.0, p0[2], v0[2], a, drag, dt)
+    zb = _stepped_xz(k, p0[2], v0[2], a, drag, dt)
+    return wp.vec3f(xa + (xb - xa) * t, za + (zb - za) * t, k)
+
+@wp.func
+def particle_rng(seed: int, frame: int, particle: int):
+    # counter-based: the state depends only on (run seed, frame, particle
+    # index), not on how many particles were emitted before
+    return wp.rand_init(wp.int32(wp.rand_init(seed, frame)), particle)
+
 @wp.kernel
 def spawn_fan(start_idx: int, n_emit: int,
               ox: wp.float32, oz: wp.float32, by: wp.float32,
               speed: wp.float32,
-              phi_h: wp.array(dtype=wp.float32),
-              theta_v: wp.array(dtype=wp.float32),
-              w_in: wp.array(dtype=wp.float32),
+              seed: int, frame: int, profile: int,
+              hw: wp.float32, ht: wp.float32,
+              fan_pow: wp.float32, weight_pow: wp.float32,
+              icdf: wp.array(dtype=wp.float32), icdf_len: int,
               P: wp.array(dtype=wp.vec3f),
               V: wp.array(dtype=wp.vec3f),
               W: wp.array(dtype=wp.float32),
               A: wp.array(dtype=wp.int32),
-              capacity: int):
+              capacity: int,
+              live_idx: wp.array(dtype=wp.int32),
+              n_live: wp.array(dtype=wp.int32)):
     t = wp.tid()
     if t >= n_emit:
         return
     idx = (start_idx + t) % capacity
 
-    ph = phi_h[t]
-    th = theta_v[t]
+    # ring buffer wrapped onto a particle still in flight: the slot is
+    # already listed, it just carries the new particle from now on
+    if A[idx] == 0:
+        k = wp.atomic_add(n_live, 0, 1)
+        live_idx[k] = idx
 
-    dx = wp.tan(ph)
-    dy = wp.float32(-1.0)
-    dz = wp.tan(th)
-
-    inv = wp.float32(1.0) / wp.sqrt(dx*dx + dy*dy + dz*dz)
-    vx = dx * inv * speed
-    vy = dy * inv * speed
-    vz = dz * inv * speed
+    state = particle_rng(seed, frame, t)
+    f = sample_fan(state, profile, hw, ht, fan_pow, weight_pow, icdf, icdf_len)
 
     P[idx] = wp.vec3f(ox, by, oz)
-    V[idx] = wp.vec3f(vx, vy, vz)
-    W[idx] = w_in[t]
+    V[idx] = fan_velocity(f[0], f[1], speed)
+    W[idx] = f[2]
     A[idx] = 1
 
 @wp.kernel
-def integrate_and_splat_ellipse(
+def spawn_fan_analytic(n_emit: int,
+                       ox: wp.float32, oz: wp.float32, by: wp.float32,
+                       speed: wp.float32,
+                       seed: int, frame: int, profile: int,
+                       hw: wp.float32, ht: wp.float32,
+                       fan_pow: wp.float32, weight_pow: wp.float32,
+                       icdf: wp.array(dtype=wp.float32), icdf_len: int,
+                       dt: wp.float32,
+                       g: wp.float32, drag: wp.float32,
+                       wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+                       tw: int, th: int,
+                       radx: int, radz: int, stamp: wp.array(dtype=wp.float32),
+                       base_inten: wp.float32,
+                       acc: wp.array(dtype=wp.float32),
+                       fr:  wp.array(dtype=wp.float32),
+                       dirty: wp.array(dtype=wp.int32),
+                       cover: wp.array(dtype=wp.int32), cover_thr: wp.float32,
+                       binned: int,
+                       hits: wp.array(dtype=wp.vec3f),
+                       n_hits: wp.array(dtype=wp.int32)):
+    # emit and deposit in one go: no particle state survives the launch
+    t = wp.tid()
+    if t >= n_emit:
+        return
+
+    state = particle_rng(seed, frame, t)
+    f = sample_fan(state, profile, hw, ht, fan_pow, weight_pow, icdf, icdf_len)
+
+    v0 = fan_velocity(f[0], f[1], speed)
+    hit = analytic_impact(wp.vec3f(ox, by, oz), v0, g, drag, dt)
+    if binned != 0:
+        record_impact(hit[0], hit[1], f[2], wall_x0, wall_w, wall_h, hits, n_hits)
+    else:
+        splat_ellipse(hit[0], hit[1], f[2],
+                      wall_x0, wall_w, wall_h, tw, th,
+                      radx, radz, stamp, base_inten, acc, fr, dirty, cover, cover_thr)
+
+@wp.kernel
+def analytic_impacts(n: int, ox: wp.float32, oz: wp.float32, by: wp.float32,
+                     V0: wp.array(dtype=wp.vec3f),
+                     dt: wp.float32, g: wp.float32, drag: wp.float32,
+                     out: wp.array(dtype=wp.vec3f)):
+    t = wp.tid()
+    if t >= n:
+        return
+    out[t] = analytic_impact(wp.vec3f(ox, by, oz), V0[t], g, drag, dt)
+
+@wp.func
+def integrate_particle(
+        i: int,
+        live_out: wp.array(dtype=wp.int32),
+        n_out: wp.array(dtype=wp.int32),
         dt: wp.float32,
         P: wp.array(dtype=wp.vec3f),
         V: wp.array(dtype=wp.vec3f),
@@ -116,11 +366,15 @@ def integrate_and_splat_ellipse(
         g: wp.float32, drag: wp.float32,
         wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
         tw: int, th: int,
-        radx: int, radz: int, edge_pow: wp.float32,
+        radx: int, radz: int, stamp: wp.array(dtype=wp.float32),
         base_inten: wp.float32,
         acc: wp.array(dtype=wp.float32),
-        fr:  wp.array(dtype=wp.float32)):
-    i = wp.tid()
+        fr:  wp.array(dtype=wp.float32),
+        dirty: wp.array(dtype=wp.int32),
+        cover: wp.array(dtype=wp.int32), cover_thr: wp.float32,
+        binned: int,
+        hits: wp.array(dtype=wp.vec3f),
+        n_hits: wp.array(dtype=wp.int32)):
     if A[i] == 0:
         return
 
@@ -136,48 +390,12 @@ def integrate_and_splat_ellipse(
         hx = p0[0] + (p1[0] - p0[0]) * t
         hz = p0[2] + (p1[2] - p0[2]) * t
 
-        if (hx >= wall_x0) and (hx <= wall_x0 + wall_w) and (hz >= 0.0) and (hz <= wall_h):
-            u  = (hx - wall_x0) / wall_w
-            vv = hz / wall_h
-
-            fw = wp.float32(tw); fh = wp.float32(th)
-            cx = wp.int(u  * (fw - 1.0))
-            cy = wp.int((1.0 - vv) * (fh - 1.0))
-
-            rx = radx
-            rz = radz
-            inten_base = base_inten * Wp[i]
-
-            for dy in range(-rz, rz+1):
-                yy = cy + dy
-                if yy < 0 or yy >= th: continue
-                ny = wp.float32(dy) / wp.float32(rz)
-                ny2 = ny * ny
-
-                for dx in range(-rx, rx+1):
-                    xx = cx + dx
-                    if xx < 0 or xx >= tw: continue
-                    nx = wp.float32(dx) / wp.float32(rx)
-
-                    # gate by ellipse
-                    d2 = nx*nx + ny2
-                    if d2 > 1.0:
-                        continue
-
-                    # explicit triangular across horizontal (nx), elliptical along vertical (ny)
-                    ax   = wp.abs(nx)                      # 0..1
-                    tri  = wp.pow(1.0 - ax, edge_pow)      # triangular in X
-                    velt = 1.0 - ny2                       # elliptical in Z (0..1)
-                    if velt <= 0.0:
-                        continue
-                    vert = wp.pow(velt, edge_pow)
-
-                    fall = tri * vert
-                    inten = inten_base * fall
-
-                    idxp = yy * tw + xx
-                    wp.atomic_add(acc, idxp, inten)
-                    wp.atomic_add(fr,  idxp, inten)
+        if binned != 0:
+            record_impact(hx, hz, Wp[i], wall_x0, wall_w, wall_h, hits, n_hits)
+        else:
+            splat_ellipse(hx, hz, Wp[i],
+                          wall_x0, wall_w, wall_h, tw, th,
+                          radx, radz, stamp, base_inten, acc, fr, dirty, cover, cover_thr)
 
         A[i] = 0
         P[i] = wp.vec3f(0.0, -1.0, 0.0)
@@ -188,49 +406,395 @@ def integrate_and_splat_ellipse(
     P[i] = p1
     V[i] = v
 
-_next = 0
+    # still in flight -> keep in the compacted list for the next step
+    k = wp.atomic_add(n_out, 0, 1)
+    live_out[k] = i
 
-def step_emit_and_sim(frame: int, tx: float, tz: float):
-    global _next
-    n = int(EMIT_PER_STEP)
-    if n <= 0:
-        return
+@wp.kernel
+def integrate_and_splat_ellipse(
+        live_idx: wp.array(dtype=wp.int32),
+        n_in: wp.array(dtype=wp.int32),
+        live_out: wp.array(dtype=wp.int32),
+        n_out: wp.array(dtype=wp.int32),
+        stride: int,
+        dt: wp.float32,
+        P: wp.array(dtype=wp.vec3f),
+        V: wp.array(dtype=wp.vec3f),
+        Wp: wp.array(dtype=wp.float32),
+        A: wp.array(dtype=wp.int32),
+        g: wp.float32, drag: wp.float32,
+        wall_x0: wp.float32, wall_w: wp.float32, wall_h: wp.float32,
+        tw: int, th: int,
+        radx: int, radz: int, stamp: wp.array(dtype=wp.float32),
+        base_inten: wp.float32,
+        acc: wp.array(dtype=wp.float32),
+        fr:  wp.array(dtype=wp.float32),
+        dirty: wp.array(dtype=wp.int32),
+        cover: wp.array(dtype=wp.int32), cover_thr: wp.float32,
+        binned: int,
+        hits: wp.array(dtype=wp.vec3f),
+        n_hits: wp.array(dtype=wp.int32)):
+    # fixed launch size, the live count stays on device: each of the stride
+    # threads takes every stride-th entry of the n_in[0] listed particles
+    j = wp.tid()
+    n = n_in[0]
+    while j < n:
+        integrate_particle(live_idx[j], live_out, n_out, dt, P, V, Wp, A, g, drag,
+                           wall_x0, wall_w, wall_h, tw, th, radx, radz, stamp, base_inten,
+                           acc, fr, dirty, cover, cover_thr, binned, hits, n_hits)
+        j += stride
 
-    # sample fan on host
-    phi_h, theta_v, base_w = _fan_angles_and_weights(n)
-
-    # upload
-    phi_wp = wp.from_numpy(phi_h,  dtype=wp.float32, device=device)
-    th_wp  = wp.from_numpy(theta_v, dtype=wp.float32, device=device)
-    w_wp   = wp.from_numpy(base_w,  dtype=wp.float32, device=device)
-
-    start = _next
-    wp.launch(
-        spawn_fan, dim=n, device=device,
-        inputs=[
-            int(start), int(n),
-            np.float32(tx), np.float32(tz), np.float32(BRUSH_Y),
-            np.float32(PARTICLE_SPEED),
-            phi_wp, th_wp, w_wp,
-            pos, vel, w_arr, alive, int(cap)
-        ],
-    )
-    _next = (start + n) % cap
+@wp.kernel
+def log_cover(cover: wp.array(dtype=wp.int32), log: wp.array(dtype=wp.int32), k: int):
+    # coverage_history without a host readback per step
+    log[k] = cover[0]
 
+def _splat_radii(cfg=config):
     # ellipse radii in pixels (thin vertically, modest width)
-    rx = max(1, int(round(ELLIPSE_RADIUS_PIX * ELLIPSE_ASPECT_X)))
-    rz = max(1, int(round(ELLIPSE_RADIUS_PIX)))
-
-    wp.launch(
-        integrate_and_splat_ellipse, dim=cap, device=device,
-        inputs=[
-            np.float32(1.0/60.0),
-            pos, vel, w_arr, alive,
-            np.float32(GRAVITY_Y), np.float32(AIR_DRAG),
-            np.float32(WALL_OFFSET_X), np.float32(WALL_W), np.float32(WALL_H),
-            int(TEXTURE_RES), int(TEXTURE_RES),
-            int(rx), int(rz), np.float32(ELLIPSE_EDGE_POWER),
-            np.float32(STICK_INTENSITY),
-            _tex_acc, _tex_fr
-        ],
-    )
+    if cfg.ELLIPSE_RADIUS_M is None:
+        rx = cfg.ELLIPSE_RADIUS_PIX * cfg.ELLIPSE_ASPECT_X
+        rz = cfg.ELLIPSE_RADIUS_PIX
+    else:
+        tw, th = psw.texel_size(cfg)
+        rx = cfg.ELLIPSE_RADIUS_M * cfg.ELLIPSE_ASPECT_X / tw
+        rz = cfg.ELLIPSE_RADIUS_M / th
+    return max(1, int(round(rx))), max(1, int(round(rz)))
+
+@functools.lru_cache(maxsize=None)
+def _param(kernel, name):
+    return [a.label for a in kernel.adj.args].index(name)
+
+# ---------------- simulation context ----------------
+
+class SprayContext:
+    """One spray simulation: particle buffers, RNG, config and paint surface.
+
+    Contexts are independent, so several walls or parameter sets can be
+    stepped side by side in one process:
+
+        with SprayContext(config.snapshot(FAN_THICK_DEG=30.0)) as ctx:
+            ctx.step_many(0, n, poses)
+            print(ctx.surface.coverage_percent())
+    """
+
+    def __init__(self, cfg=None, surface=None, device=device):
+        wp.init()
+        self.cfg = cfg = cfg if cfg is not None else config.snapshot()
+        self.device = device
+        self._owns_surface = surface is None     # close() only frees a surface made here
+        self.surface = surface if surface is not None else psw.make_surface(cfg, device=device)
+
+        cap = self.cap = int(cfg.PARTICLE_CAP)
+        self.pos    = wp.zeros(cap, dtype=wp.vec3f,   device=device)
+        self.vel    = wp.zeros(cap, dtype=wp.vec3f,   device=device)
+        self.alive  = wp.zeros(cap, dtype=wp.int32,   device=device)
+        self.w_arr  = wp.zeros(cap, dtype=wp.float32, device=device)
+        self._next = 0
+
+        # live-particle index: integrate only visits slots in flight.
+        # Survivors are compacted into the other buffer each step (double-buffered).
+        self.live       = wp.zeros(cap, dtype=wp.int32, device=device)
+        self.live_next  = wp.zeros(cap, dtype=wp.int32, device=device)
+        # Both counts stay on device; only num_live() (and profiling) read them.
+        self.live_count = wp.zeros(1,   dtype=wp.int32, device=device)
+        self.live_count_next = wp.zeros(1, dtype=wp.int32, device=device)
+        # integrate threads: about a particle each at the usual few frames of flight
+        self.n_integrate = min(cap, 8 * max(1, int(cfg.EMIT_PER_STEP)))
+
+        # impact buffer for DEPOSIT_MODE == "binned" (always used by a hits_only surface)
+        self.binned = cfg.DEPOSIT_MODE == "binned" or self.surface.hits_only
+        self.hits   = wp.zeros(max(cap, int(cfg.EMIT_PER_STEP)), dtype=wp.vec3f, device=device)
+        self.n_hits = wp.zeros(1, dtype=wp.int32, device=device)
+
+        self.stamp = self._build_stamp()
+        self.icdf = wp.from_numpy(_cosine_icdf(cfg.FAN_POWER), dtype=wp.float32, device=device)
+
+        # RUN_SEED keys every particle's draws; None -> different spray every run
+        if cfg.RUN_SEED is not None:
+            self.seed = int(cfg.RUN_SEED)
+        else:
+            self.seed = int(np.random.default_rng().integers(2**31))
+        self._cmds = None
+        self.metrics_log = []   # step_many(): surface.metrics() + step, every METRICS_EVERY steps
+        # coverage_history: the running counter after every step_many() step,
+        # logged on device and read back when the property is read
+        self._cover_log = wp.zeros(1024, dtype=wp.int32, device=device)
+        self._cover_steps = []
+        self._log_cmd = None
+
+    def close(self):
+        """Drop all device buffers now, and the surface if this context created it.
+
+        A surface passed to the constructor stays open; its owner closes it.
+        """
+        for k, v in list(vars(self).items()):
+            if isinstance(v, wp.array):
+                setattr(self, k, None)
+        self._cmds = None
+        self._log_cmd = None
+        if self.surface is not None and self._owns_surface:
+            self.surface.close()
+        self.surface = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def num_live(self):
+        """Particles currently in flight."""
+        return int(self.live_count.numpy()[0])
+
+    @property
+    def coverage_history(self):
+        """(step, coverage %) after every step_many() step, oldest first."""
+        counts = self._cover_log.numpy()[:len(self._cover_steps)]
+        n = float(self.surface.N)
+        return [(s, 100.0 * float(c) / n) for s, c in zip(self._cover_steps, counts)]
+
+    def _build_stamp(self):
+        """Splat footprint as a (2*rz+1) x (2*rx+1) weight table, row-major."""
+        rx, rz = _splat_radii(self.cfg)
+        stamp = wp.zeros((2*rx + 1) * (2*rz + 1), dtype=wp.float32, device=self.device)
+        wp.launch(build_splat_stamp, dim=stamp.shape[0], device=self.device,
+                  inputs=[int(rx), int(rz), np.float32(self.cfg.ELLIPSE_EDGE_POWER), stamp])
+        return stamp
+
+    def _fan_inputs(self, frame=0):
+        """Kernel inputs for sampling frame's particles on device."""
+        c = self.cfg
+        return [int(self.seed), int(frame), _fan_profile_id(c.FAN_PROFILE),
+                np.float32(math.radians(c.FAN_WIDTH_DEG * 0.5)),
+                np.float32(math.radians(c.FAN_THICK_DEG * 0.5)),
+                np.float32(c.FAN_POWER), np.float32(c.FAN_WEIGHT_POWER),
+                self.icdf, ICDF_LEN]
+
+    # ---------------- recorded launches ----------------
+    # Kernel arguments are packed once; per frame only the nozzle pose, frame
+    # (the RNG key) and ring position change.  Stepped mode keeps one spawn/integrate
+    # pair per direction of the live-list double buffer.
+
+    def _record(self):
+        c = self.cfg
+        n = int(c.EMIT_PER_STEP)
+        rx, rz = _splat_radii(c)
+        surf = self.surface
+        physics = [np.float32(c.GRAVITY_Y), np.float32(c.AIR_DRAG),
+                   np.float32(c.WALL_OFFSET_X), np.float32(c.WALL_W), np.float32(c.WALL_H),
+                   surf.W, surf.H,
+                   int(rx), int(rz), self.stamp,
+                   np.float32(c.STICK_INTENSITY),
+                   *surf.splat_targets(), np.float32(c.COVER_THRESH),
+                   int(self.binned), self.hits, self.n_hits]
+        cmds = {}
+        if c.IMPACT_MODE == "analytic":
+            cmds["analytic"] = wp.launch(
+                spawn_fan_analytic, dim=n, device=self.device, record_cmd=True,
+                inputs=[int(n), np.float32(0.0), np.float32(0.0), np.float32(c.BRUSH_Y),
+                        np.float32(c.PARTICLE_SPEED), *self._fan_inputs(),
+                        np.float32(DT), *physics])
+            return cmds
+        lists = ((self.live, self.live_count), (self.live_next, self.live_count_next))
+        for (src, n_src), (dst, n_dst) in (lists, lists[::-1]):
+            cmds[("spawn", src.ptr)] = wp.launch(
+                spawn_fan, dim=n, device=self.device, record_cmd=True,
+                inputs=[0, int(n), np.float32(0.0), np.float32(0.0), np.float32(c.BRUSH_Y),
+                        np.float32(c.PARTICLE_SPEED), *self._fan_inputs(),
+                        self.pos, self.vel, self.w_arr, self.alive, self.cap, src, n_src])
+            cmds[("integrate", src.ptr)] = wp.launch(
+                integrate_and_splat_ellipse, dim=self.n_integrate, device=self.device, record_cmd=True,
+                inputs=[src, n_src, dst, n_dst, self.n_integrate, np.float32(DT),
+                        self.pos, self.vel, self.w_arr, self.alive, *physics])
+        return cmds
+
+    def step(self, frame: int, tx: float, tz: float):
+        """Emit EMIT_PER_STEP particles from world (tx, tz) and advance one frame."""
+        n = int(self.cfg.EMIT_PER_STEP)
+        if n <= 0:
+            return
+        if self._cmds is None:
+            self._cmds = self._record()
+        if self.binned:
+            self.n_hits.zero_()
+        if self.cfg.IMPACT_MODE == "analytic":
+            # hit point solved at spawn; nothing is kept across frames
+            cmd = self._cmds["analytic"]
+            cmd.set_param_at_index(_param(spawn_fan_analytic, "ox"), float(tx))
+            cmd.set_param_at_index(_param(spawn_fan_analytic, "oz"), float(tz))
+            cmd.set_param_at_index(_param(spawn_fan_analytic, "frame"), int(frame))
+            with profiling.span("emit", sync=True):
+                cmd.launch()
+            profiling.count("particles_emitted", n)
+            self._deposit_hits()
+            return
+
+        cmd = self._cmds[("spawn", self.live.ptr)]
+        cmd.set_param_at_index(_param(spawn_fan, "start_idx"), int(self._next))
+        cmd.set_param_at_index(_param(spawn_fan, "ox"), float(tx))
+        cmd.set_param_at_index(_param(spawn_fan, "oz"), float(tz))
+        cmd.set_param_at_index(_param(spawn_fan, "frame"), int(frame))
+        with profiling.span("emit", sync=True):
+            cmd.launch()
+        self._next = (self._next + n) % self.cap
+        if profiling.enabled():
+            profiling.count("particle_steps", int(self.live_count.numpy()[0]))
+
+        self.live_count_next.zero_()
+        with profiling.span("integrate", sync=True):
+            self._cmds[("integrate", self.live.ptr)].launch()
+        self.live, self.live_next = self.live_next, self.live
+        self.live_count, self.live_count_next = self.live_count_next, self.live_count
+        profiling.count("particles_emitted", n)
+        self._deposit_hits()
+
+    def step_many(self, frame_start: int, n_frames: int, poses, stop=None):
+        """Advance n_frames frames from frame_start in one call; returns the
+        number of frames run.
+
+        poses holds the world nozzle (tx, tz) of each frame, shape (n_frames, 2).
+        Each frame is step() followed by surface.post_step(), replayed from
+        pre-recorded launches, so the texture matches the per-frame loop.
+        Every frame adds (frame, coverage %) to coverage_history (logged on
+        device, no readback); frames that are a multiple of METRICS_EVERY
+        also append their surface.metrics() to metrics_log.  With stop (a
+        stopping.StopRule) the call ends after the first frame the rule
+        fires on; a rule with no criterion set is not checked.
+        """
+        poses = np.asarray(poses, dtype=np.float32).reshape(n_frames, 2)
+        every = int(self.cfg.METRICS_EVERY)
+        span = profiling.span
+        for i in range(n_frames):
+            f = frame_start + i
+            with span("step"):
+                self.step(f, poses[i, 0], poses[i, 1])
+                with span("post_step", sync=True):
+                    self.surface.post_step()
+                self._log_coverage(f)
+                if every > 0 and f % every == 0:
+                    with span("metrics", sync=True):
+                        self.metrics_log.append(dict(step=f, **self.surface.metrics()))
+                if stop is not None and stop.enabled:
+                    with span("stop_check"):
+                        if stop.check(f, self.surface):
+                            return i + 1
+        return n_frames
+
+    def _log_coverage(self, f):
+        k = len(self._cover_steps)
+        if k == self._cover_log.shape[0]:
+            grown = wp.zeros(2 * k, dtype=wp.int32, device=self.device)
+            wp.copy(grown, self._cover_log, count=k)
+            self._cover_log = grown
+            self._log_cmd = None
+        if self._log_cmd is None:
+            self._log_cmd = wp.launch(log_cover, dim=1, device=self.device, record_cmd=True,
+                                      inputs=[self.surface.cover, self._cover_log, k])
+        self._log_cmd.set_param_at_index(_param(log_cover, "k"), k)
+        self._log_cmd.launch()
+        self._cover_steps.append(f)
+
+    def _deposit_hits(self):
+        c = self.cfg
+        if not self.binned:
+            return
+        rx, rz = _splat_radii(c)
+        with profiling.span("deposit", sync=True):
+            self.surface.deposit_binned(self.hits, int(self.n_hits.numpy()[0]), self.stamp,
+                                        rx, rz, c.STICK_INTENSITY)
+
+    def check_analytic_impact(self, n=4096, tol=1e-4):
+        """Compare analytic impact points against the stepped integrator.
+
+        Samples n fan directions from a nozzle in front of the wall centre and
+        returns the largest hit-point distance in metres.  Raises if it
+        exceeds tol.
+        """
+        c = self.cfg
+        phi_h, theta_v, _ = _fan_angles_and_weights(n, c, np.random.default_rng(self.seed))
+        dx = np.tan(phi_h); dz = np.tan(theta_v)
+        d = np.stack([dx, -np.ones_like(dx), dz], axis=1)
+        v0 = (d / np.linalg.norm(d, axis=1, keepdims=True) * c.PARTICLE_SPEED).astype(np.float32)
+
+        ox = c.WALL_OFFSET_X + 0.5 * c.WALL_W
+        oz = 0.5 * c.WALL_H
+        out = wp.zeros(n, dtype=wp.vec3f, device=self.device)
+        wp.launch(
+            analytic_impacts, dim=n, device=self.device,
+            inputs=[int(n), np.float32(ox), np.float32(oz), np.float32(c.BRUSH_Y),
+                    wp.from_numpy(v0, dtype=wp.vec3f, device=self.device),
+                    np.float32(DT), np.float32(c.GRAVITY_Y), np.float32(c.AIR_DRAG), out],
+        )
+        ana = out.numpy()[:, :2]
+        ref = _stepped_impacts_np((ox, c.BRUSH_Y, oz), v0, DT, c.GRAVITY_Y, c.AIR_DRAG)
+
+        err = float(np.max(np.hypot(ana[:, 0] - ref[:, 0], ana[:, 1] - ref[:, 1])))
+        if not err <= tol:
+            raise RuntimeError(f"analytic impact off by {err:.3g} m (tol {tol:.3g} m)")
+        return err
+
+# ---------------- analytic vs stepped check ----------------
+
+def _stepped_impacts_np(p0, v0, dt, gravity, air_drag, max_steps=10_000):
+    """Host replica of integrate_and_splat_ellipse's flight (no splat)."""
+    g = np.float32(gravity); drag = np.float32(air_drag); dt = np.float32(dt)
+    p = np.broadcast_to(np.asarray(p0, dtype=np.float32), v0.shape).copy()
+    v = v0.astype(np.float32).copy()
+    hit = np.full((v0.shape[0], 2), np.nan, dtype=np.float32)
+    flying = np.ones(v0.shape[0], dtype=bool)
+    for _ in range(max_steps):
+        if not flying.any():
+            break
+        vf = v[flying]
+        vf[:, 1] -= g * dt
+        vf *= np.float32(1.0) / (np.float32(1.0) + drag * dt)
+        p0f = p[flying]
+        p1f = p0f + vf * dt
+        cross = (p0f[:, 1] > 0.0) & (p1f[:, 1] <= 0.0)
+        t = p0f[cross, 1] / (p0f[cross, 1] - p1f[cross, 1])
+        idx = np.flatnonzero(flying)
+        hit[idx[cross], 0] = p0f[cross, 0] + (p1f[cross, 0] - p0f[cross, 0]) * t
+        hit[idx[cross], 1] = p0f[cross, 2] + (p1f[cross, 2] - p0f[cross, 2]) * t
+        v[flying] = vf
+        p[flying] = p1f
+        flying[idx[cross]] = False
+    return hit
+
+# ---------------- kernel cache ----------------
+
+def warm(device=device):
+    """Initialise Warp and build the simulation kernels, or load them from
+    Warp's kernel cache; returns the seconds taken.
+
+    Otherwise this happens on the first launch of a run.  Calling it ahead
+    of time (python run_simulation.py --warm, e.g. when an image is built)
+    fills the on-disk cache, so later short jobs only load the binaries.
+    """
+    t0 = time.perf_counter()
+    wp.init()
+    wp.force_load(device=device, modules=[wp.get_module(__name__), wp.get_module(psw.__name__)])
+    return time.perf_counter() - t0
+
+# ---------------- module-level API on a default context ----------------
+# Shares psw's default surface, so psw.download_rgb() etc. see the same paint.
+
+_default = None
+
+def default_context():
+    global _default
+    if _default is None:
+        _default = SprayContext(surface=psw.default_surface())
+    return _default
+
+def num_live():
+    """Particles currently in flight."""
+    return default_context().num_live()
+
+def step_emit_and_sim(frame: int, tx: float, tz: float):
+    default_context().step(frame, tx, tz)
+
+def step_many(frame_start: int, n_frames: int, poses, stop=None):
+    return default_context().step_many(frame_start, n_frames, poses, stop)
+
+def check_analytic_impact(n=4096, tol=1e-4):
+    return default_context().check_analytic_impact(n, tol)
@@ -0,0 +1,171 @@
+"""Named timing spans for a run, summarised as JSON.
+
+    profiling.start()                        # run_simulation does this when PROFILE is set
+    with profiling.span("post_step", sync=True):
+        surface.post_step()
+    profiling.count("particles_emitted", n)
+    summary = profiling.stop()               # dict; profiling.write_json(summary, path)
+
+Spans nest (the per-frame "step" span contains "emit", "integrate", ...),
+so totals of parent and child spans overlap.  sync=True calls
+wp.synchronize() on entry and exit, so queued kernel work is charged to
+the span that launched it.  Spans may be opened from worker threads.
+
+While no profiler is running, span() returns a shared do-nothing context
+manager and count() returns at once: the hooks cost a global lookup and a
+function call.  Anything computed only for a counter goes under
+`if profiling.enabled():`.  No pxr import.
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import warp as wp
+
+HIST_BINS = 16
+SIM_SPAN = "step"   # counters also get a rate over the time spent in this span
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullSpan()
+
+def _sync():
+    if wp.context.runtime is not None:    # nothing to wait for before Warp starts
+        wp.synchronize()
+
+
+class _Span:
+    __slots__ = ("prof", "name", "sync", "t0")
+
+    def __init__(self, prof, name, sync):
+        self.prof = prof
+        self.name = name
+        self.sync = sync
+
+    def __enter__(self):
+        if self.sync:
+            _sync()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.sync:
+            _sync()
+        self.prof.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class Profiler:
+    """Durations of every span (seconds, by name) and integer counters."""
+
+    def __init__(self):
+        self.times = collections.defaultdict(list)
+        self.counters = collections.defaultdict(int)
+        self._lock = threading.Lock()
+        self.t_start = time.perf_counter()
+        self.t_stop = None
+
+    def span(self, name, sync=False):
+        return _Span(self, name, sync)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.times[name].append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += int(n)
+
+    def summary(self):
+        """JSON-ready dict: wall time, per-span statistics and histograms, counters.
+
+        spans[name]: count, total_s, mean_ms, min_ms, p50_ms, p90_ms, p99_ms,
+        max_ms, share (total_s / wall_s) and hist ({edges_ms, counts}, HIST_BINS
+        equal-width bins).  counters[name]: total, per_s (over the wall time)
+        and, when SIM_SPAN ran, per_sim_s (over the time spent in it).
+        """
+        wall = (self.t_stop if self.t_stop is not None else time.perf_counter()) - self.t_start
+        with self._lock:
+            times = {k: np.asarray(v) * 1e3 for k, v in self.times.items()}
+            counters = dict(self.counters)
+        spans = {}
+        for name, ms in sorted(times.items(), key=lambda kv: -kv[1].sum()):
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            counts, edges = np.histogram(ms, bins=HIST_BINS)
+            spans[name] = {
+                "count": int(ms.size), "total_s": float(ms.sum()) / 1e3,
+                "mean_ms": float(ms.mean()), "min_ms": float(ms.min()),
+                "p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+                "share": float(ms.sum()) / 1e3 / wall if wall > 0 else 0.0,
+                "hist": {"edges_ms": edges.tolist(), "counts": counts.tolist()},
+            }
+        sim = spans[SIM_SPAN]["total_s"] if SIM_SPAN in spans else 0.0
+        out_counters = {}
+        for name, n in counters.items():
+            c = out_counters[name] = {"total": n, "per_s": n / wall if wall > 0 else 0.0}
+            if sim > 0:
+                c["per_sim_s"] = n / sim
+        return {"wall_s": wall, "spans": spans, "counters": out_counters}
+
+# ---------------- process-wide profiler ----------------
+
+_active = None
+
+def start():
+    """Start collecting (replacing any running profiler); returns the Profiler."""
+    global _active
+    _active = Profiler()
+    return _active
+
+def stop():
+    """Stop collecting; returns the summary, or None if nothing was running."""
+    global _active
+    prof, _active = _active, None
+    if prof is None:
+        return None
+    prof.t_stop = time.perf_counter()
+    return prof.summary()
+
+def enabled():
+    """True while a profiler runs.  Guards work done only to feed it, such
+    as a device readback for count() (SprayContext.step's particle_steps)."""
+    return _active is not None
+
+def span(name, sync=False):
+    """Context manager timing the block as name (a no-op unless start() was called)."""
+    prof = _active
+    return _NULL if prof is None else _Span(prof, name, sync)
+
+def count(name, n=1):
+    """Add n to counter name (a no-op unless start() was called)."""
+    prof = _active
+    if prof is not None:
+        prof.count(name, n)
+
+# ---------------- output ----------------
+
+def write_json(summary, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(summary, fh, indent=1)
+
+def format_table(summary, top=12):
+    """The top spans by total time, one line each, plus the counters."""
+    lines = [f"   {'span':18s} {'calls':>8s} {'total s':>9s} {'share':>6s} {'mean ms':>9s} {'p99 ms':>9s}"]
+    for name, s in list(summary["spans"].items())[:top]:
+        lines.append(f"   {name:18s} {s['count']:8d} {s['total_s']:9.2f} {100 * s['share']:5.1f}% "
+                     f"{s['mean_ms']:9.3f} {s['p99_ms']:9.3f}")
+    for name, c in summary["counters"].items():
+        rate = c.get("per_sim_s", c["per_s"])
+        lines.append(f"   {name}: {c['total']} ({rate:,.0f}/s)")
+    return "\n".join(lines)
@@ -0,0 +1,67 @@
+"""Early termination: end a run once the wall is painted well enough.
+
+    rule = StopRule(cfg)                      # STOP_* from config
+    n = ctx.step_many(0, cfg.STEPS, poses, stop=rule)
+    if rule.reason:
+        print(f"stopped after {n} steps ({rule.sim_time:.1f} s): {rule.reason}")
+
+Coverage comes from the surface's running counter, so watching it costs
+nothing; STOP_CV needs surface.metrics() (one reduction) per step.  With
+every STOP_* left at None the rule never fires.  No pxr import.
+"""
+import collections
+
+from . import config
+
+
+class StopRule:
+    """Checked by SprayContext.step_many() after every step.
+
+    Fires when any enabled criterion holds:
+      STOP_COVERAGE_PCT: coverage_percent() >= target
+      STOP_CV:           metrics()["cv"] <= target (once coverage > 0)
+      STOP_PLATEAU_PCT:  coverage gained < this over the last STOP_PLATEAU_STEPS steps
+    """
+
+    def __init__(self, cfg=None):
+        self.cfg = cfg = cfg if cfg is not None else config.snapshot()
+        self.coverage_pct = cfg.STOP_COVERAGE_PCT
+        self.cv = cfg.STOP_CV
+        self.plateau_pct = cfg.STOP_PLATEAU_PCT
+        self.plateau_steps = max(1, int(cfg.STOP_PLATEAU_STEPS))
+        self._window = collections.deque(maxlen=self.plateau_steps + 1)
+        self.reason = None
+        self.step = None
+
+    @property
+    def enabled(self):
+        return any(v is not None for v in (self.coverage_pct, self.cv, self.plateau_pct))
+
+    @property
+    def sim_time(self):
+        """Simulated seconds up to and including the stop step (None if not stopped)."""
+        return None if self.step is None else (self.step + 1) / float(self.cfg.FPS)
+
+    def check(self, step: int, surface) -> bool:
+        """Record step's state; True (and reason / step set) when the run should end."""
+        if self.reason is not None:
+            return True
+        cov = surface.coverage_percent()
+        if self.coverage_pct is not None and cov >= self.coverage_pct:
+            return self._stop(step, f"coverage {cov:.2f}% >= {self.coverage_pct}%")
+        if self.cv is not None and cov > 0.0:
+            cv = surface.metrics()["cv"]
+            if cv <= self.cv:
+                return self._stop(step, f"cv {cv:.3f} <= {self.cv}")
+        if self.plateau_pct is not None:
+            self._window.append(cov)
+            if len(self._window) == self._window.maxlen and cov > 0.0:
+                gain = cov - self._window[0]
+                if gain < self.plateau_pct:
+                    return self._stop(step, f"coverage plateau ({gain:.3f}% in {self.plateau_steps} steps)")
+        return False
+
+    def _stop(self, step, reason):
+        self.step = step
+        self.reason = reason
+        return True
@@ -0,0 +1,135 @@
+"""Nozzle path and arm joint angles for every step of a run, as arrays.
+
+    tr = trajectory()            # or trajectory(config.snapshot(...))
+    pp.step_many(0, n, tr.poses[:n])
+    tr.shoulder_deg[f], tr.elbow_deg[f]
+
+The result is cached on the config values it depends on, so the solver,
+the USD animation and the snapshots all read the same arrays.  Arrays are
+read-only.  No pxr import.
+"""
+import functools
+
+import numpy as np
+
+from . import config
+
+# config names the path and IK depend on (the cache key)
+_KEYS = (
+    "STEPS", "FRAMES_PER_PASS", "TOTAL_ROWS", "ROW_HEIGHT", "EDGE_MARGIN",
+    "WALL_W", "WALL_H", "WALL_OFFSET_X",
+    "ARM_BASE_X", "ARM_BASE_Z", "LINK1_LEN", "LINK2_LEN", "ELBOW_UP",
+)
+
+
+class Trajectory:
+    """Per-step arrays (length STEPS).
+
+    local:        (STEPS, 2) wall-local nozzle target (x in [0, WALL_W], z in [0, WALL_H])
+    world:        (STEPS, 2) the same in world X / Z
+    poses:        world as float32, the layout step_many() takes
+    shoulder_deg: shoulder angle (deg), as _solve_angles_world returns it
+    elbow_deg:    elbow angle relative to the shoulder (deg)
+    """
+
+    def __init__(self, local, world, shoulder_deg, elbow_deg):
+        self.local = local
+        self.world = world
+        self.poses = world.astype(np.float32)
+        self.shoulder_deg = shoulder_deg
+        self.elbow_deg = elbow_deg
+        for a in (self.local, self.world, self.poses, self.shoulder_deg, self.elbow_deg):
+            a.flags.writeable = False
+
+    def __len__(self):
+        return len(self.local)
+
+    def nozzle_pose(self, frame: int):
+        """Wall-local (tx, tz) of one step."""
+        return float(self.local[frame, 0]), float(self.local[frame, 1])
+
+    def angles(self, frame: int):
+        """(shoulder_deg, elbow_deg) of one step."""
+        return float(self.shoulder_deg[frame]), float(self.elbow_deg[frame])
+
+
+def trajectory(cfg=config) -> Trajectory:
+    """Trajectory for cfg (module config or a config.snapshot()), cached."""
+    return _build(tuple(getattr(cfg, k) for k in _KEYS))
+
+@functools.lru_cache(maxsize=8)
+def _build(key) -> Trajectory:
+    c = dict(zip(_KEYS, key))
+    local = nozzle_path(np.arange(c["STEPS"]), c)
+    world = local + np.array([c["WALL_OFFSET_X"], 0.0])
+    a1, a_elbow = solve_angles(world[:, 0], world[:, 1], c)
+    return Trajectory(local, world, a1, a_elbow)
+
+# ---------------- serpentine raster over +Z wall ----------------
+
+def nozzle_path(frames, c):
+    """Wall-local (tx, tz) for an array of frames, shape (n, 2).
+
+    Starts top-left, sweeps L->R, steps down, R->L, etc.  c is a mapping
+    with the names in _KEYS.
+    """
+    frames = np.asarray(frames)
+    fpp = c["FRAMES_PER_PASS"]
+    # Clamp row to last valid row to avoid lingering sweeps at the bottom
+    row = np.minimum(frames // fpp, max(0, c["TOTAL_ROWS"] - 1))
+    frac = np.zeros(frames.shape) if fpp <= 1 else (frames % fpp) / float(fpp - 1)
+
+    # horizontal sweep on the wall (include off-panel margin during motion,
+    # but clamp to the panel for the returned target)
+    x_lo = -c["EDGE_MARGIN"]
+    x_hi = c["WALL_W"] + c["EDGE_MARGIN"]
+    x_m = np.where(row % 2 == 0, x_lo + frac * (x_hi - x_lo), x_hi - frac * (x_hi - x_lo))
+    x = np.clip(x_m, 0.0, c["WALL_W"])
+
+    # row center from top to bottom, clamped into the panel
+    z = np.clip(c["WALL_H"] - (row + 0.5) * c["ROW_HEIGHT"], 0.0, c["WALL_H"])
+    return np.stack([x, z], axis=-1)
+
+# ---------------- 2-link planar IK (XZ plane) ----------------
+
+def solve_angles(tx_world, tz_world, c):
+    """(shoulder_deg, elbow_deg_relative) in USD RotateY sense for world
+    targets (x, z); arrays or scalars.  Elbow bends 'up' (positive Z) when
+    ELBOW_UP."""
+    tx_world = np.asarray(tx_world, dtype=np.float64)
+    tz_world = np.asarray(tz_world, dtype=np.float64)
+    bx, bz = c["ARM_BASE_X"], c["ARM_BASE_Z"]
+    L1, L2 = c["LINK1_LEN"], c["LINK2_LEN"]
+    dx = tx_world - bx
+    dz = tz_world - bz
+
+    # clamp to reachable circle
+    dist = np.hypot(dx, dz)
+    max_r = L1 + L2 - 1e-6
+    s = np.where(dist > max_r, max_r / np.maximum(dist, max_r), 1.0)
+    dx = dx * s
+    dz = dz * s
+
+    # cosine law
+    D = np.clip((dx*dx + dz*dz - L1*L1 - L2*L2) / (2.0 * L1 * L2), -1.0, 1.0)
+
+    # choose elbow-up (negative sine) if requested
+    theta2 = np.arccos(D)
+    if c["ELBOW_UP"]:
+        theta2 = -theta2
+
+    k1 = L1 + L2 * np.cos(theta2)
+    k2 = L2 * np.sin(theta2)
+    theta1 = np.arctan2(dz, dx) - np.arctan2(k2, k1)
+    a1 = np.degrees(theta1)
+
+    # elbow position, then the world direction of link2 relative to the shoulder
+    ex = bx + L1 * np.cos(theta1)
+    ez = bz + L1 * np.sin(theta1)
+    a2_world = np.degrees(np.arctan2(tz_world - ez, tx_world - ex))
+    return a1, a2_world - a1
+
+
+def params(cfg=config):
+    """The config values the trajectory depends on, as a mapping."""
+    return {k: getattr(cfg, k) for k in _KEYS}
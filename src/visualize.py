@@ -3,14 +3,14 @@ import os
 import math
 
 from .config import (
-    OUT_DIR, FPS,
+    OUT_DIR, FPS, USD_FORMAT,
     WALL_W, WALL_H, WALL_OFFSET_X,
     BRUSH_Y, FAN_ANGLE_DEG,
     VIS_CONE_HEIGHT, VIS_CONE_SPREAD_SCALE,
     LINK1_LEN, LINK2_LEN,
     ARM_BASE_X, ARM_BASE_Z,
 )
-from . import wall_model
+from .trajectory import trajectory
 
 
 # ---------- small utilities ----------
@@ -35,14 +35,17 @@ def _ensure_uvs(stage: Usd.Stage, wall_prim: Usd.Prim) -> None:
     )
 
 
-def _bind_emissive_texture(stage: Usd.Stage, wall_prim: Usd.Prim, png_rel: str) -> None:
-    """Create a self‑lit material on /Wall that points to png_rel."""
+def _bind_emissive_texture(stage: Usd.Stage, wall_prim: Usd.Prim, png_rel: str = None) -> UsdShade.Input:
+    """Create a self‑lit material on /Wall that points to png_rel.
+
+    Returns the texture's file input so callers can time-sample it instead."""
     mat = UsdShade.Material.Define(stage, "/Wall/PaintMat")
 
     tex = UsdShade.Shader.Define(stage, "/Wall/PaintMat/Tex")
     tex.CreateIdAttr("UsdUVTexture")
     tex_file = tex.CreateInput("file", Sdf.ValueTypeNames.Asset)
-    tex_file.Set(png_rel)
+    if png_rel is not None:
+        tex_file.Set(png_rel)
     tex.CreateInput("wrapS", Sdf.ValueTypeNames.Token).Set("clamp")
     tex.CreateInput("wrapT", Sdf.ValueTypeNames.Token).Set("clamp")
     tex.CreateInput("sourceColorSpace", Sdf.ValueTypeNames.Token).Set("sRGB")
@@ -66,6 +69,7 @@ def _bind_emissive_texture(stage: Usd.Stage, wall_prim: Usd.Prim, png_rel: str)
 
     mat.CreateSurfaceOutput().ConnectToSource(surf_out)
     UsdShade.MaterialBindingAPI(wall_prim).Bind(mat)
+    return tex_file
 
 
 def _find_wall(stage: Usd.Stage) -> Usd.Prim:
@@ -112,51 +116,16 @@ def _cyl_along_x(stage: Usd.Stage, path: str, length: float, radius: float, colo
     return c
 
 
-# ---------- public writers ----------
+def _make_arm(stage: Usd.Stage):
+    """Arm, nozzle, fan cone and target sphere (same layout as the template).
 
-def write_frame(base_stage: Usd.Stage, mask_png: str, idx: int) -> None:
-    """
-    Legacy writer: reuse template with full animation but bind a single PNG.
-    Paint will NOT animate when scrubbing in this file.
-    """
-    tpl_path = base_stage.GetRootLayer().realPath
-    stage = Usd.Stage.Open(tpl_path)
-    wall = _find_wall(stage)
-    _ensure_uvs(stage, wall)
-    _bind_emissive_texture(stage, wall, os.path.basename(mask_png))
-    out_path = os.path.join(OUT_DIR, f"frame_{idx:04d}.usda")
-    stage.GetRootLayer().Export(out_path)
-
-
-def write_snapshot(mask_png: str, idx: int, step_f: int) -> None:
+    Returns the (shoulder rotate, elbow rotate, target translate) ops.
     """
-    Build a fresh USD with the arm frozen at simulation step 'step_f',
-    and the wall material pointing to mask_png. No animation in the file.
-    """
-    out_path = os.path.join(OUT_DIR, f"frame_{idx:04d}.usda")
-    stage = Usd.Stage.CreateNew(out_path)
-    UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
-    UsdGeom.SetStageMetersPerUnit(stage, 1.0)
-    stage.SetTimeCodesPerSecond(FPS)
-    stage.SetStartTimeCode(0)
-    stage.SetEndTimeCode(0)
-
-    UsdGeom.Xform.Define(stage, "/World")
-
-    wall_prim = _make_wall(stage)
-    _bind_emissive_texture(stage, wall_prim, os.path.basename(mask_png))
-
-    # Compute arm pose for this simulation step
-    tx, tz = wall_model._nozzle_pose(step_f)
-    txw = WALL_OFFSET_X + tx
-    tzw = tz
-    a1, a_elbow = wall_model._solve_angles_world(txw, tzw)
-
     base = UsdGeom.Xform.Define(stage, "/World/ArmBasePos")
     base.AddTranslateOp().Set(Gf.Vec3d(ARM_BASE_X, BRUSH_Y, ARM_BASE_Z))
 
     sh = UsdGeom.Xform.Define(stage, "/World/ArmBasePos/ShoulderJoint")
-    sh.AddRotateYOp().Set(-a1)  # sign flip used consistently in pipeline
+    r_sh = sh.AddRotateYOp()
     _cyl_along_x(stage, "/World/ArmBasePos/ShoulderJoint/Link1Geom",
                  LINK1_LEN, 0.04, (0.15, 0.6, 0.9))
 
@@ -164,7 +133,7 @@ def write_snapshot(mask_png: str, idx: int, step_f: int) -> None:
     elpos.AddTranslateOp().Set(Gf.Vec3d(LINK1_LEN, 0.0, 0.0))
 
     el = UsdGeom.Xform.Define(stage, "/World/ArmBasePos/ShoulderJoint/ElbowPos/ElbowJoint")
-    el.AddRotateYOp().Set(-a_elbow)
+    r_el = el.AddRotateYOp()
     _cyl_along_x(stage, "/World/ArmBasePos/ShoulderJoint/ElbowPos/ElbowJoint/Link2Geom",
                  LINK2_LEN, 0.035, (0.2, 0.8, 0.3))
 
@@ -192,96 +161,104 @@ def write_snapshot(mask_png: str, idx: int, step_f: int) -> None:
     sph = UsdGeom.Sphere.Define(stage, "/World/Target")
     sph.CreateRadiusAttr(0.03)
     UsdGeom.Gprim(sph).GetDisplayColorAttr().Set(Vt.Vec3fArray([Gf.Vec3f(1.0, 1.0, 0.0)]))
-    sph.AddTranslateOp().Set(Gf.Vec3d(txw, BRUSH_Y, tzw))
+    sph_t = sph.AddTranslateOp()
+    return r_sh, r_el, sph_t
 
-    stage.GetRootLayer().Save()
 
+def _arm_pose(step_f: int):
+    """(shoulder, elbow, target) values for simulation step step_f."""
+    tr = trajectory()
+    txw, tzw = tr.world[step_f]
+    # sign flip used consistently in pipeline
+    return -tr.shoulder_deg[step_f], -tr.elbow_deg[step_f], Gf.Vec3d(txw, BRUSH_Y, tzw)
 
-def write_anim(base_stage: Usd.Stage, png_paths, out_name: str = "paint_anim.usda") -> None:
+
+def _new_stage(out_path: str, end_time: float) -> Usd.Stage:
+    stage = Usd.Stage.CreateNew(out_path)
+    UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
+    UsdGeom.SetStageMetersPerUnit(stage, 1.0)
+    stage.SetTimeCodesPerSecond(FPS)
+    stage.SetStartTimeCode(0)
+    stage.SetEndTimeCode(end_time)
+    UsdGeom.Xform.Define(stage, "/World")
+    return stage
+
+
+# ---------- public writers ----------
+
+def write_frame(base_stage: Usd.Stage, mask_png: str, idx: int) -> None:
     """
-    Animated USD whose texture 'file' input is time‑sampled across png_paths.
-    Some tools (usdview/Omniverse) will show the paint evolving when scrubbing.
-    Blender may hold the last image.
+    Legacy writer: reuse template with full animation but bind a single PNG.
+    Paint will NOT animate when scrubbing in this file.
     """
     tpl_path = base_stage.GetRootLayer().realPath
     stage = Usd.Stage.Open(tpl_path)
-
     wall = _find_wall(stage)
     _ensure_uvs(stage, wall)
+    _bind_emissive_texture(stage, wall, os.path.basename(mask_png))
+    out_path = os.path.join(OUT_DIR, f"frame_{idx:04d}.usda")
+    stage.GetRootLayer().Export(out_path)
 
-    mat = UsdShade.Material.Define(stage, "/Wall/PaintMat")
-    tex = UsdShade.Shader.Define(stage, "/Wall/PaintMat/Tex")
-    tex.CreateIdAttr("UsdUVTexture")
-    file_in = tex.CreateInput("file", Sdf.ValueTypeNames.Asset)
-    tex.CreateInput("wrapS", Sdf.ValueTypeNames.Token).Set("clamp")
-    tex.CreateInput("wrapT", Sdf.ValueTypeNames.Token).Set("clamp")
-    tex.CreateInput("sourceColorSpace", Sdf.ValueTypeNames.Token).Set("sRGB")
 
-    pvr = UsdShade.Shader.Define(stage, "/Wall/PaintMat/STReader")
-    pvr.CreateIdAttr("UsdPrimvarReader_float2")
-    pvr.CreateInput("varname", Sdf.ValueTypeNames.Token).Set("st")
-    pvr_out = pvr.CreateOutput("result", Sdf.ValueTypeNames.Float2)
-    tex.CreateInput("st", Sdf.ValueTypeNames.Float2).ConnectToSource(pvr_out)
-    tex_rgb = tex.CreateOutput("rgb", Sdf.ValueTypeNames.Float3)
+def write_snapshot(mask_png: str, idx: int, step_f: int) -> None:
+    """
+    Build a fresh USD with the arm frozen at simulation step 'step_f',
+    and the wall material pointing to mask_png. No animation in the file.
+    Only written when USD_SNAPSHOTS is on; write_paint_anim covers all frames.
+    """
+    stage = _new_stage(os.path.join(OUT_DIR, f"frame_{idx:04d}.{USD_FORMAT}"), 0)
 
-    surf = UsdShade.Shader.Define(stage, "/Wall/PaintMat/Surf")
-    surf.CreateIdAttr("UsdPreviewSurface")
-    surf.CreateInput("diffuseColor",  Sdf.ValueTypeNames.Color3f).ConnectToSource(tex_rgb)
-    surf.CreateInput("emissiveColor", Sdf.ValueTypeNames.Color3f).ConnectToSource(tex_rgb)
-    surf_out = surf.CreateOutput("surface", Sdf.ValueTypeNames.Token)
+    wall_prim = _make_wall(stage)
+    _bind_emissive_texture(stage, wall_prim, os.path.basename(mask_png))
 
-    mat.CreateSurfaceOutput().ConnectToSource(surf_out)
-    UsdShade.MaterialBindingAPI(wall).Bind(mat)
+    r_sh, r_el, sph_t = _make_arm(stage)
+    sh, el, target = _arm_pose(step_f)
+    r_sh.Set(sh)
+    r_el.Set(el)
+    sph_t.Set(target)
 
-    for s, p in enumerate(png_paths):
-        file_in.Set(os.path.basename(p), time=s)
+    stage.GetRootLayer().Save()
 
-    stage.SetTimeCodesPerSecond(FPS)
-    stage.SetStartTimeCode(0)
-    stage.SetEndTimeCode(max(0, len(png_paths) - 1))
 
-    out_path = os.path.join(OUT_DIR, out_name)
-    stage.GetRootLayer().Export(out_path)
+def write_paint_anim(png_paths, steps, out_name: str = None) -> str:
+    """
+    One animated layer for the whole run: wall, arm and material are authored
+    once; each saved frame s only adds time samples (time=s) for the two joint
+    angles, the target and the texture file.  Written as USD_FORMAT
+    ("usdc" for a binary crate file).  Returns the path written.
+    """
+    out_path = os.path.join(OUT_DIR, out_name or f"paint_anim.{USD_FORMAT}")
+    stage = _new_stage(out_path, max(0, len(png_paths) - 1))
+
+    wall_prim = _make_wall(stage)
+    file_in = _bind_emissive_texture(stage, wall_prim)
+    r_sh, r_el, sph_t = _make_arm(stage)
+
+    for s, (p, f) in enumerate(zip(png_paths, steps)):
+        sh, el, target = _arm_pose(f)
+        r_sh.Set(sh, time=s)
+        r_el.Set(el, time=s)
+        sph_t.Set(target, time=s)
+        file_in.Set(os.path.basename(p), time=s)
 
-# --- add near the other writers ---
+    stage.GetRootLayer().Save()
+    return out_path
 
-def write_anim_usdview(base_stage: Usd.Stage, png_paths, out_name: str = "paint_anim_usdview.usda") -> None:
-    """Animated USD with time‑sampled UsdUVTexture.inputs:file (usdview shows paint evolving)."""
+
+def write_anim(base_stage: Usd.Stage, png_paths, out_name: str = "paint_anim.usda") -> None:
+    """
+    Animated USD whose texture 'file' input is time‑sampled across png_paths.
+    Some tools (usdview/Omniverse) will show the paint evolving when scrubbing.
+    Blender may hold the last image.  Copies the whole template; prefer
+    write_paint_anim.
+    """
     tpl_path = base_stage.GetRootLayer().realPath
     stage = Usd.Stage.Open(tpl_path)
 
-    # find/create wall + UVs
-    wall = stage.GetPrimAtPath("/Wall")
-    if not wall.IsValid():
-        wall = stage.GetPrimAtPath("/World/Wall")
-    if not wall.IsValid():
-        raise RuntimeError("Wall prim not found")
+    wall = _find_wall(stage)
     _ensure_uvs(stage, wall)
+    file_in = _bind_emissive_texture(stage, wall)
 
-    # material network
-    mat = UsdShade.Material.Define(stage, "/Wall/PaintMat")
-    tex = UsdShade.Shader.Define(stage, "/Wall/PaintMat/Tex")
-    tex.CreateIdAttr("UsdUVTexture")
-    file_in = tex.CreateInput("file", Sdf.ValueTypeNames.Asset)
-    tex.CreateInput("wrapS", Sdf.ValueTypeNames.Token).Set("clamp")
-    tex.CreateInput("wrapT", Sdf.ValueTypeNames.Token).Set("clamp")
-    tex.CreateInput("sourceColorSpace", Sdf.ValueTypeNames.Token).Set("sRGB")
-    pvr = UsdShade.Shader.Define(stage, "/Wall/PaintMat/STReader")
-    pvr.CreateIdAttr("UsdPrimvarReader_float2")
-    pvr.CreateInput("varname", Sdf.ValueTypeNames.Token).Set("st")
-    pvr_out = pvr.CreateOutput("result", Sdf.ValueTypeNames.Float2)
-    tex.CreateInput("st", Sdf.ValueTypeNames.Float2).ConnectToSource(pvr_out)
-    tex_rgb = tex.CreateOutput("rgb", Sdf.ValueTypeNames.Float3)
-
-    surf = UsdShade.Shader.Define(stage, "/Wall/PaintMat/Surf")
-    surf.CreateIdAttr("UsdPreviewSurface")
-    surf.CreateInput("diffuseColor",  Sdf.ValueTypeNames.Color3f).ConnectToSource(tex_rgb)
-    surf.CreateInput("emissiveColor", Sdf.ValueTypeNames.Color3f).ConnectToSource(tex_rgb)
-    surf_out = surf.CreateOutput("surface", Sdf.ValueTypeNames.Token)
-    UsdShade.MaterialBindingAPI(wall).Bind(mat)
-    mat.CreateSurfaceOutput().ConnectToSource(surf_out)
-
-    # time-sample the file input
     for s, p in enumerate(png_paths):
         file_in.Set(os.path.basename(p), time=s)
 
@@ -293,6 +270,11 @@ def write_anim_usdview(base_stage: Usd.Stage, png_paths, out_name: str = "paint_
     stage.GetRootLayer().Export(out_path)
 
 
+def write_anim_usdview(base_stage: Usd.Stage, png_paths, out_name: str = "paint_anim_usdview.usda") -> None:
+    """Animated USD with time‑sampled UsdUVTexture.inputs:file (usdview shows paint evolving)."""
+    write_anim(base_stage, png_paths, out_name=out_name)
+
+
 def write_anim_blender_stub(base_stage: Usd.Stage, out_name: str = "paint_anim_blender.usda") -> None:
     """
     Blender-friendly USD: keep arm animation, bind a placeholder material to the wall.
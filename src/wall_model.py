@@ -3,83 +3,27 @@ import os, math
 from .config import (
     WALL_W, WALL_H, WALL_D,
     FAN_ANGLE_DEG, BRUSH_Y, VIS_CONE_HEIGHT, VIS_CONE_SPREAD_SCALE,
-    OUT_DIR, STEPS, FRAMES_PER_PASS, SAVE_EVERY,
-    ROW_HEIGHT, ANIM_SAMPLE_STRIDE, FPS,            # <- use FPS
+    OUT_DIR, STEPS, SAVE_EVERY,
+    ANIM_SAMPLE_STRIDE, FPS,            # <- use FPS
     ARM_BASE_X, ARM_BASE_Z, LINK1_LEN, LINK2_LEN,
-    WALL_OFFSET_X, ELBOW_UP, EDGE_MARGIN, TOTAL_ROWS
+    WALL_OFFSET_X,
 )
+from .trajectory import trajectory, solve_angles, params
 
 USD_PATH = os.path.join(OUT_DIR, "wall_template.usda")
 
-# ---------------- serpentine raster over +Z wall ----------------
+# ---------------- path / IK (per step; see trajectory.py for whole-run arrays) ----------------
 def _nozzle_pose(frame: int):
     """Return (tx, tz) in wall-local coordinates:
        x in [0..WALL_W], z in [0..WALL_H], starting top-left,
        sweeping L->R, step down, R->L, etc."""
-    # Clamp row to last valid row to avoid lingering sweeps at the bottom
-    row  = min(frame // FRAMES_PER_PASS, max(0, TOTAL_ROWS - 1))
-    fin  = frame %  FRAMES_PER_PASS
-    frac = 0.0 if FRAMES_PER_PASS <= 1 else fin / float(FRAMES_PER_PASS - 1)
-
-    # horizontal sweep on the wall (include off-panel margin during motion,
-    # but clamp to the panel for the returned target)
-    x_lo = -EDGE_MARGIN
-    x_hi = WALL_W + EDGE_MARGIN
-    if row % 2 == 0:
-        x_m = x_lo + frac * (x_hi - x_lo)    # left -> right
-    else:
-        x_m = x_hi - frac * (x_hi - x_lo)    # right -> left
-    x = max(0.0, min(WALL_W, x_m))
-
-    # row center from top to bottom
-    z_center = WALL_H - (row + 0.5) * ROW_HEIGHT
-    # clamp into panel just in case
-    z_center = max(0.0, min(WALL_H, z_center))
-
-    return x, z_center
-
-# ---------------- 2‑link planar IK (XZ plane), elbow-up branch ----------------
+    return trajectory().nozzle_pose(frame)
+
 def _solve_angles_world(tx_world: float, tz_world: float):
     """Return (shoulder_deg, elbow_deg_relative) in USD RotateY sense,
        for target point in WORLD coords (x,z). Elbow bends 'up' (positive Z)."""
-    dx = tx_world - ARM_BASE_X
-    dz = tz_world - ARM_BASE_Z
-    L1, L2 = LINK1_LEN, LINK2_LEN
-
-    # clamp to reachable circle
-    dist = math.hypot(dx, dz)
-    max_r = L1 + L2 - 1e-6
-    if dist > max_r:
-        s = max_r / dist
-        dx *= s; dz *= s
-
-    # cosine law
-    D = (dx*dx + dz*dz - L1*L1 - L2*L2) / (2.0 * L1 * L2)
-    D = max(-1.0, min(1.0, D))
-
-    # choose elbow-up (negative sine) if requested
-    theta2 = math.acos(D)
-    if ELBOW_UP:
-        theta2 = -theta2  # negative sin -> bend 'up'
-
-    k1 = L1 + L2 * math.cos(theta2)
-    k2 = L2 * math.sin(theta2)          # negative when ELBOW_UP True
-
-    theta1 = math.atan2(dz, dx) - math.atan2(k2, k1)
-
-    # world angles in degrees
-    a1 = math.degrees(theta1)
-
-    # elbow position
-    ex = ARM_BASE_X + L1 * math.cos(theta1)
-    ez = ARM_BASE_Z + L1 * math.sin(theta1)
-
-    # desired world direction of link2
-    a2_world = math.degrees(math.atan2(tz_world - ez, tx_world - ex))
-
-    # elbow joint is relative to shoulder
-    a_elbow = a2_world - a1
-    return a1, a_elbow
+    a1, a_elbow = solve_angles(tx_world, tz_world, params())
+    return float(a1), float(a_elbow)
 
 # ---------------- helpers ----------------
 def _cyl_along_x(stage, path, length, radius, color):
@@ -111,7 +55,10 @@ def _make_wall_plane(stage):
     return wall
 
 # ---------------- build ----------------
-def build_template():
+def build_template(n_steps: int = None):
+    """Template stage with the arm animated over the first n_steps steps
+    (all STEPS by default, fewer when a run stopped early)."""
+    n_steps = STEPS if n_steps is None else min(int(n_steps), STEPS)
     stage = Usd.Stage.CreateNew(USD_PATH)
     UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
     UsdGeom.SetStageMetersPerUnit(stage, 1.0)
@@ -178,18 +125,16 @@ def build_template():
     sph_t = sphere.AddTranslateOp(); sphere.SetXformOpOrder([sph_t])
 
     # Time metadata (downsampled)
-    frames_anim = (STEPS - 1) // ANIM_SAMPLE_STRIDE + 1
+    frames_anim = (n_steps - 1) // ANIM_SAMPLE_STRIDE + 1
     stage.SetTimeCodesPerSecond(FPS)
     stage.SetStartTimeCode(0)
     stage.SetEndTimeCode(frames_anim - 1)
 
-    for s, f in enumerate(range(0, STEPS, ANIM_SAMPLE_STRIDE)):
-        tx, tz = _nozzle_pose(f)                 # wall-local
-        txw = WALL_OFFSET_X + tx                 # world
-        tzw = tz
-        a1, a_elbow = _solve_angles_world(txw, tzw)
-        r_sh.Set(-a1,      time=s)               # sign flip for +Z wall
-        r_el.Set(-a_elbow, time=s)
+    tr = trajectory()
+    for s, f in enumerate(range(0, n_steps, ANIM_SAMPLE_STRIDE)):
+        txw, tzw = tr.world[f]                   # world
+        r_sh.Set(-tr.shoulder_deg[f], time=s)    # sign flip for +Z wall
+        r_el.Set(-tr.elbow_deg[f],    time=s)
         sph_t.Set(Gf.Vec3d(txw, BRUSH_Y, tzw), time=s)
 
     stage.GetRootLayer().Save()
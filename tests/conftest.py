@@ -0,0 +1,29 @@
+"""Shared setup: CPU Warp, the repo root on sys.path, small configs
+(defined in helpers.py).
+
+Runs are kept small (64 x 64 texels, 50 steps) so the whole suite takes
+seconds once Warp's kernel cache is warm.
+"""
+import os
+import sys
+os.environ["WARP_DISABLE_CUDA"] = "1"   # force CPU for Warp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import warp as wp
+
+wp.config.quiet = True
+
+import helpers
+
+
+@pytest.fixture
+def small_cfg():
+    """small_cfg(**overrides) -> config.snapshot of a 64 x 64 run."""
+    return helpers.small_config
+
+
+@pytest.fixture
+def poses():
+    """poses(cfg, n=STEPS) -> the first n nozzle poses of cfg's path."""
+    return helpers.small_poses
@@ -0,0 +1,17 @@
+"""The small run every test uses, importable outside pytest's fixtures
+(conftest.py wraps it; worker processes import it directly)."""
+from src import config
+from src.trajectory import trajectory
+
+SMALL = {"TEXTURE_RES": 64, "ELLIPSE_RADIUS_PIX": 3, "METRICS_EVERY": 0, "RUN_SEED": 3}
+STEPS = 50
+
+
+def small_config(**overrides):
+    """config.snapshot of a 64 x 64 run."""
+    return config.snapshot(**{**SMALL, **overrides})
+
+
+def small_poses(cfg, n=STEPS):
+    """The first n nozzle poses of cfg's path."""
+    return trajectory(cfg).poses[:n]
@@ -0,0 +1,28 @@
+"""IMPACT_MODE="analytic": the hit point solved at spawn is the stepped integrator's."""
+import pytest
+
+from src import particle_paint as pp
+
+
+@pytest.mark.parametrize("drag", [0.6, 0.0])
+@pytest.mark.parametrize("profile", ["triangular", "cosine", "flat"])
+def test_matches_stepped_flight(small_cfg, drag, profile):
+    cfg = small_cfg(AIR_DRAG=drag, FAN_PROFILE=profile)
+    with pp.SprayContext(cfg) as ctx:
+        err = ctx.check_analytic_impact(n=2048, tol=1e-4)
+    assert 0.0 <= err <= 1e-4
+
+
+def test_check_raises_above_tolerance(small_cfg):
+    with pp.SprayContext(small_cfg()) as ctx:
+        with pytest.raises(RuntimeError, match="analytic impact off by"):
+            ctx.check_analytic_impact(n=256, tol=-1.0)
+
+
+def test_analytic_run_paints(small_cfg, poses):
+    cfg = small_cfg(IMPACT_MODE="analytic")
+    p = poses(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        ctx.step_many(0, len(p), p)
+        assert ctx.num_live() == 0          # nothing is kept in flight
+        assert ctx.surface.accum_numpy().max() > 0.0
@@ -0,0 +1,20 @@
+"""SprayContext lifetime: closing a context frees only what it created."""
+from src import paint_surface_warp as psw
+from src import particle_paint as pp
+
+
+def test_close_keeps_a_passed_surface(small_cfg, poses):
+    cfg = small_cfg()
+    p = poses(cfg)
+    with psw.PaintSurface(cfg) as surface:
+        with pp.SprayContext(cfg, surface=surface) as ctx:
+            ctx.step_many(0, len(p), p)
+        assert ctx.surface is None
+        assert surface.accum is not None
+        assert surface.accum_numpy().max() > 0.0
+
+
+def test_close_frees_an_owned_surface(small_cfg):
+    with pp.SprayContext(small_cfg()) as ctx:
+        surface = ctx.surface
+    assert surface.accum is None
@@ -0,0 +1,58 @@
+"""The running coverage counter equals a full recount of the texture."""
+import numpy as np
+import pytest
+
+from src import particle_paint as pp
+
+MODES = [
+    {},
+    {"DEPOSIT_MODE": "binned"},
+    {"IMPACT_MODE": "analytic"},
+    {"DIRTY_REGION": True},
+    {"GAUSS_SIGMA_PIX": 0.0},
+    {"GAUSS_SIGMA_PIX": 1.5, "COVER_THRESH": 0.5},
+    {"PAINT_SURFACE": "tiled", "PAINT_TILE": 16},
+]
+
+
+def _check(surface, thr):
+    acc = surface.accum_numpy()
+    covered = acc >= thr
+    assert covered.any()
+    assert surface.coverage_percent() == 100.0 * covered.sum() / acc.size
+    assert surface.metrics()["coverage_pct"] == pytest.approx(surface.coverage_percent(), abs=1e-12)
+    np.testing.assert_array_equal(surface.row_coverage(), covered.sum(axis=1) / acc.shape[1])
+
+
+@pytest.mark.parametrize("mode", MODES, ids=lambda m: ",".join(f"{k}={v}" for k, v in m.items()) or "default")
+def test_counter_equals_recount(small_cfg, poses, mode):
+    cfg = small_cfg(**mode)
+    p = poses(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        for f in range(0, len(p), 10):
+            ctx.step_many(f, 10, p[f:f + 10])
+            _check(ctx.surface, cfg.COVER_THRESH)
+        history = dict(ctx.coverage_history)
+        assert history[len(p) - 1] == ctx.surface.coverage_percent()
+
+
+def test_unfused_effects_recount(small_cfg, poses):
+    cfg = small_cfg()
+    p = poses(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        for f in range(len(p)):
+            ctx.step(f, p[f, 0], p[f, 1])
+            ctx.surface.gaussian_blur_both()
+            ctx.surface.decay_fresh()
+            ctx.surface.clamp_both()
+        _check(ctx.surface, cfg.COVER_THRESH)
+
+
+def test_clear_mask_resets_counter(small_cfg, poses):
+    cfg = small_cfg()
+    p = poses(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        ctx.step_many(0, len(p), p)
+        ctx.surface.clear_mask()
+        assert ctx.surface.coverage_percent() == 0.0
+        assert not ctx.surface.row_coverage().any()
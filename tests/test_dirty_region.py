@@ -0,0 +1,81 @@
+"""DIRTY_REGION: the region post-step against the full-texture one."""
+import numpy as np
+import pytest
+
+from src import paint_surface_warp as psw
+
+
+def _surface(small_cfg, **overrides):
+    s = psw.PaintSurface(small_cfg(DIRTY_REGION=True, GAUSS_SIGMA_PIX=1.5, **overrides))
+    assert s.radius > 1
+    return s
+
+
+def _paint(s, a, box):
+    s.accum.assign(a.ravel())
+    s.fresh.assign(a.ravel())
+    _mark(s, box)
+
+
+def _mark(s, box):
+    s.dirty.assign(np.array(box, dtype=np.int32))
+
+
+@pytest.fixture
+def texture(small_cfg):
+    n = small_cfg().TEXTURE_RES
+    a = np.zeros((n, n), dtype=np.float32)
+    a[20:40, 10:30] = np.random.default_rng(0).random((20, 20), dtype=np.float32) * 0.3
+    a[5:15, 40:60] = 0.2        # older paint, outside the region
+    return a
+
+
+def test_whole_texture_region_is_the_full_post_step(small_cfg, texture):
+    n = texture.shape[0]
+    with _surface(small_cfg) as s, \
+         psw.PaintSurface(small_cfg(GAUSS_SIGMA_PIX=1.5)) as full:
+        _paint(s, texture, [0, 0, n - 1, n - 1])
+        _paint(full, texture, [0, 0, n - 1, n - 1])
+        s.post_step()
+        full.post_step()
+        np.testing.assert_array_equal(s.accum_numpy(), full.accum_numpy())
+        np.testing.assert_array_equal(s.fresh.numpy(), full.fresh.numpy())
+
+
+def test_only_the_region_changes(small_cfg, texture):
+    with _surface(small_cfg) as s:
+        _paint(s, texture, [12, 22, 27, 37])
+        s.post_step()
+        a = s.accum_numpy()
+        r = s.radius
+        inside = np.zeros(a.shape, dtype=bool)
+        inside[22 - r:37 + r + 1, 12 - r:27 + r + 1] = True
+        np.testing.assert_array_equal(a[~inside], texture[~inside])
+        assert not np.array_equal(a[inside], texture[inside])
+
+
+def test_never_decaying_fresh_keeps_everything_painted(small_cfg, texture):
+    with _surface(small_cfg, FRESH_DECAY=1.0) as s:
+        assert s.dirty_keep == 0
+        _paint(s, texture, [40, 5, 59, 14])
+        s.post_step()
+        _mark(s, [12, 22, 27, 37])
+        before = s.accum_numpy()
+        s.post_step()
+        after = s.accum_numpy()
+        # the first frame's paint is still blurred on the second
+        assert not np.array_equal(after[5:15, 40:60], before[5:15, 40:60])
+
+
+def test_boxes_age_by_frame(small_cfg, texture):
+    with _surface(small_cfg, FRESH_DECAY=0.5) as s:
+        keep = s.dirty_keep
+        assert keep > 1
+        _paint(s, texture, [12, 22, 27, 37])
+        for _ in range(keep):               # frames without any new deposit
+            before = s.accum_numpy()
+            s.post_step()
+            assert not np.array_equal(s.accum_numpy(), before)
+        before = s.accum_numpy()
+        s.post_step()
+        np.testing.assert_array_equal(s.accum_numpy(), before)
@@ -0,0 +1,43 @@
+"""The device fan sampler (sample_fan) draws from the host reference's distribution."""
+import numpy as np
+import pytest
+import warp as wp
+
+from src import particle_paint as pp
+
+N = 200_000
+
+
+@wp.kernel
+def draw_fan(seed: int, frame: int, profile: int,
+             hw: wp.float32, ht: wp.float32,
+             fan_pow: wp.float32, weight_pow: wp.float32,
+             icdf: wp.array(dtype=wp.float32), icdf_len: int,
+             out: wp.array(dtype=wp.vec3f)):
+    t = wp.tid()
+    out[t] = pp.sample_fan(pp.particle_rng(seed, frame, t), profile, hw, ht,
+                           fan_pow, weight_pow, icdf, icdf_len)
+
+
+def _device(cfg):
+    """(phi_h, theta_v, weight) of N particles of one frame, as spawn_fan draws them."""
+    with pp.SprayContext(cfg) as ctx:
+        out = wp.zeros(N, dtype=wp.vec3f, device=ctx.device)
+        wp.launch(draw_fan, dim=N, device=ctx.device, inputs=[*ctx._fan_inputs(frame=5), out])
+        return out.numpy().T
+
+
+@pytest.mark.parametrize("profile", ["flat", "cosine", "triangular"])
+def test_device_matches_host(small_cfg, profile):
+    cfg = small_cfg(FAN_PROFILE=profile)
+    host = pp._fan_angles_and_weights(N, cfg, np.random.default_rng(1))
+    dev = _device(cfg)
+    hw, ht = np.radians(cfg.FAN_WIDTH_DEG * 0.5), np.radians(cfg.FAN_THICK_DEG * 0.5)
+    for name, h, d, lim in zip(("phi_h", "theta_v", "weight"), host, dev, (hw, ht, 1.0)):
+        h = h.astype(np.float64)
+        d = d.astype(np.float64)
+        se = h.std() * np.sqrt(2.0 / N)          # standard error of the difference of means
+        assert abs(d.mean() - h.mean()) < 5.0 * se + 1e-9, name
+        assert d.std() == pytest.approx(h.std(), rel=0.02, abs=1e-9), name
+        assert abs(d).mean() == pytest.approx(abs(h).mean(), rel=0.02, abs=1e-9), name
+        assert np.abs(d).max() <= lim * (1.0 + 1e-6), name
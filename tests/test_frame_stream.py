@@ -0,0 +1,76 @@
+"""FrameStream reads back what FrameStreamWriter stored."""
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src import frame_stream as fs
+from src.paint_surface_warp import accum_to_rgb
+
+H, W = 24, 40
+N = 21
+
+
+@pytest.fixture
+def frames():
+    """N growing paint fields in [0, 1], as a run saves them."""
+    rng = np.random.default_rng(0)
+    steps = rng.random((N, H, W), dtype=np.float32) * 0.08
+    return np.minimum(np.cumsum(steps, axis=0), 1.0).astype(np.float32)
+
+
+def _write(path, frames, **kw):
+    w = fs.FrameStreamWriter(str(path), H, W, **kw)
+    for i, acc in enumerate(frames):
+        w.append(acc, step=10 * i)
+    return w
+
+
+def test_float32_round_trip(tmp_path, frames):
+    path = tmp_path / "s.bin"
+    _write(path, frames).close()
+    s = fs.FrameStream(str(path))
+    assert len(s) == N
+    np.testing.assert_array_equal(s.steps, 10 * np.arange(N))
+    assert s.raw.shape == (N, H, W)
+    for i, acc in enumerate(s):
+        np.testing.assert_array_equal(acc, frames[i])
+
+
+def test_float16_deltas_round_trip(tmp_path, frames):
+    path = tmp_path / "s.bin"
+    _write(path, frames, dtype="float16", delta=True, key_every=8).close()
+    s = fs.FrameStream(str(path))
+    np.testing.assert_array_equal(np.flatnonzero(s.keys), [0, 8, 16])
+    # each frame is one float16 rounding of a value (or delta) below 1 away
+    tol = 2.0 ** -11
+    for i in list(range(N)) + [20, 3, 9, 8, 7]:     # in order, then jumping around
+        np.testing.assert_allclose(s.frame(i), frames[i], rtol=0, atol=tol, err_msg=f"frame {i}")
+    assert s.frame(-1).dtype == np.float32
+
+
+def test_unclosed_stream_recovers_complete_frames(tmp_path, frames):
+    path = tmp_path / "s.bin"
+    w = _write(path, frames[:11], dtype="float16", delta=True, key_every=4)
+    w._fh.write(b"\0" * 10)                          # a frame cut off mid-write
+    w._fh.flush()
+    try:
+        s = fs.FrameStream(str(path))
+        assert len(s) == 11
+        assert (s.steps == -1).all()
+        np.testing.assert_array_equal(np.flatnonzero(s.keys), [0, 4, 8])
+        np.testing.assert_allclose(s.frame(10), frames[10], rtol=0, atol=2.0 ** -11)
+    finally:
+        w._fh.close()
+
+
+def test_export_pngs(tmp_path, frames, small_cfg):
+    path = tmp_path / "s.bin"
+    _write(path, frames[:3]).close()
+    cfg = small_cfg()
+    paths = fs.export_pngs(str(path), str(tmp_path / "png"), cfg)
+    assert [os.path.basename(p) for p in paths] == ["mask_0000.png", "mask_0001.png", "mask_0002.png"]
+    for p, acc in zip(paths, frames):
+        img = np.asarray(Image.open(p))
+        np.testing.assert_array_equal(img, np.stack(accum_to_rgb(acc, cfg), axis=2))
@@ -0,0 +1,37 @@
+"""Counters and spans are collected only while a profiler runs."""
+from src import particle_paint as pp
+from src import profiling
+
+
+def _run(cfg, p):
+    with pp.SprayContext(cfg) as ctx:
+        steps = 0
+        for f in range(len(p)):
+            steps += ctx.num_live()      # in flight before the frame's spawn
+            ctx.step_many(f, 1, p[f:f + 1])
+        return steps
+
+
+def test_counters_while_enabled(small_cfg, poses):
+    cfg = small_cfg()
+    p = poses(cfg)
+    assert not profiling.enabled()
+    profiling.start()
+    try:
+        assert profiling.enabled()
+        survivors = _run(cfg, p)
+    finally:
+        summary = profiling.stop()
+    assert not profiling.enabled()
+    n = int(cfg.EMIT_PER_STEP) * len(p)
+    counters = summary["counters"]
+    assert counters["particles_emitted"]["total"] == n
+    # every particle listed for integrate: survivors plus this frame's spawn
+    assert counters["particle_steps"]["total"] == survivors + n
+    assert summary["spans"]["step"]["count"] == len(p)
+
+
+def test_nothing_collected_while_off(small_cfg, poses):
+    cfg = small_cfg()
+    _run(cfg, poses(cfg))
+    assert profiling.stop() is None
@@ -0,0 +1,23 @@
+"""run_simulation.py --metrics-only prints one strict JSON object."""
+import json
+import math
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _reject(name):
+    raise ValueError(f"non-standard JSON constant {name}")
+
+
+def test_metrics_only_unpainted_wall_is_strict_json():
+    # one step: no particle has landed yet, so mean is 0 and cv is NaN
+    out = subprocess.run([sys.executable, "run_simulation.py", "--metrics-only", "TEXTURE_RES=64", "--steps", "1"],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    row = json.loads(out, parse_constant=_reject)
+    assert row["steps"] == 1
+    assert row["mean"] == 0.0
+    assert row["cv"] is None
+    assert all(v is None or not isinstance(v, float) or math.isfinite(v) for v in row.values())
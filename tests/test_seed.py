@@ -0,0 +1,58 @@
+"""RUN_SEED: a run is bit-for-bit reproducible however frames are batched,
+and whichever process runs it."""
+import multiprocessing as mp
+
+import numpy as np
+
+from src import particle_paint as pp
+
+from helpers import STEPS, small_config, small_poses
+
+
+def _final_accum(overrides, batches):
+    """accum after STEPS steps, stepped in batches of the given sizes
+    (module level, so a spawned worker process can run it too)."""
+    cfg = small_config(**overrides)
+    p = small_poses(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        f = 0
+        for n in batches:
+            ctx.step_many(f, n, p[f:f + n])
+            f += n
+        assert f == STEPS
+        return ctx.surface.accum_numpy()
+
+
+def test_batching_does_not_change_the_run():
+    ref = _final_accum({}, [STEPS])
+    for batches in ([1] * STEPS, [7, 13, 30], [49, 1]):
+        np.testing.assert_array_equal(_final_accum({}, batches), ref)
+
+
+def test_same_in_another_process():
+    ref = _final_accum({}, [STEPS])
+    with mp.get_context("spawn").Pool(1) as pool:
+        other = pool.apply(_final_accum, ({}, [20, 30]))
+    np.testing.assert_array_equal(other, ref)
+
+
+def test_frame_draws_depend_on_frame_only(small_cfg, poses):
+    # frame 30's spray is the same whether or not frames 0..29 ran before
+    cfg = small_cfg(IMPACT_MODE="analytic")
+    p = poses(cfg)
+    out = []
+    for skip in (False, True):
+        with pp.SprayContext(cfg) as ctx:
+            if not skip:
+                ctx.step_many(0, 30, p[:30])
+                ctx.surface.clear_mask()
+            ctx.step(30, p[30, 0], p[30, 1])
+            out.append(ctx.surface.accum_numpy())
+    assert out[0].max() > 0.0
+    np.testing.assert_array_equal(out[1], out[0])
+
+
+def test_seed_changes_the_spray():
+    a = _final_accum({"RUN_SEED": 1}, [STEPS])
+    b = _final_accum({"RUN_SEED": 2}, [STEPS])
+    assert not np.array_equal(a, b)
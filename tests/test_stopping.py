@@ -0,0 +1,76 @@
+"""StopRule: each STOP_* criterion ends step_many() on the step it first holds."""
+import numpy as np
+import pytest
+
+from src import particle_paint as pp
+from src.stopping import StopRule
+
+
+def _run(cfg, p):
+    """(steps run, rule, coverage % of every step run)."""
+    rule = StopRule(cfg)
+    with pp.SprayContext(cfg) as ctx:
+        n = ctx.step_many(0, len(p), p, stop=rule)
+        cov = np.array([c for _, c in ctx.coverage_history])
+    assert len(cov) == n
+    return n, rule, cov
+
+
+def _stopped_at(n, rule, p):
+    assert n < len(p)
+    assert rule.step == n - 1
+    assert rule.sim_time == n / float(rule.cfg.FPS)
+
+
+def test_coverage_target(small_cfg, poses):
+    cfg = small_cfg(STOP_COVERAGE_PCT=1.0)
+    p = poses(cfg)
+    n, rule, cov = _run(cfg, p)
+    _stopped_at(n, rule, p)
+    assert rule.reason.startswith("coverage ")
+    assert cov[-1] >= 1.0 and (cov[:-1] < 1.0).all()
+
+
+def test_cv_target(small_cfg, poses):
+    # any cv passes: fires on the first step with paint above COVER_THRESH
+    cfg = small_cfg(STOP_CV=1e9)
+    p = poses(cfg)
+    n, rule, cov = _run(cfg, p)
+    _stopped_at(n, rule, p)
+    assert rule.reason.startswith("cv ")
+    assert cov[-1] > 0.0 and (cov[:-1] == 0.0).all()
+
+
+def test_plateau(small_cfg, poses):
+    # any gain is below 100 %: fires once the window is full and coverage > 0
+    cfg = small_cfg(STOP_PLATEAU_PCT=100.0, STOP_PLATEAU_STEPS=5)
+    p = poses(cfg)
+    n, rule, cov = _run(cfg, p)
+    _stopped_at(n, rule, p)
+    assert rule.reason.startswith("coverage plateau")
+    assert n - 1 == max(5, int(np.flatnonzero(cov > 0.0)[0]))
+
+
+def test_no_criterion_is_not_checked(small_cfg, poses, monkeypatch):
+    cfg = small_cfg()
+    p = poses(cfg)
+    rule = StopRule(cfg)
+    assert not rule.enabled
+    monkeypatch.setattr(rule, "check", lambda *a: pytest.fail("disabled rule was checked"))
+    with pp.SprayContext(cfg) as ctx:
+        assert ctx.step_many(0, len(p), p, stop=rule) == len(p)
+    assert rule.reason is None and rule.step is None
+
+
+def test_usd_range_ends_at_the_stop(small_cfg, poses, tmp_path, monkeypatch):
+    pytest.importorskip("pxr")
+    from src import wall_model
+
+    cfg = small_cfg(STOP_COVERAGE_PCT=1.0)
+    n, _, _ = _run(cfg, poses(cfg))
+    ends = []
+    for name, steps in (("full", None), ("stopped", n)):
+        monkeypatch.setattr(wall_model, "USD_PATH", str(tmp_path / f"{name}.usda"))
+        ends.append(wall_model.build_template(steps).GetEndTimeCode())
+    assert ends[1] == (n - 1) // wall_model.ANIM_SAMPLE_STRIDE
+    assert ends[1] < ends[0]
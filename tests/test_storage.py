@@ -0,0 +1,76 @@
+"""16-bit texel storage (ACCUM_DTYPE / FRESH_DTYPE) stays within its error bound."""
+import numpy as np
+import pytest
+
+from src import paint_surface_warp as psw
+from src import particle_paint as pp
+
+# h: largest rounding error of one store of a value in [0, 2)
+H = {"float16": 2.0 ** -11, "fix16": 2.0 ** -16}
+
+
+def _run(cfg, p):
+    with pp.SprayContext(cfg) as ctx:
+        ctx.step_many(0, len(p), p)
+        s = ctx.surface
+        fresh = psw.decode_texels(s.fresh.numpy()).reshape(s.H, s.W)
+        return s.accum_numpy(), fresh, s.coverage_percent()
+
+
+@pytest.fixture
+def reference(small_cfg, poses):
+    """float32 run with binned deposition (as 16-bit storage always uses)."""
+    cfg = small_cfg(DEPOSIT_MODE="binned")
+    return _run(cfg, poses(cfg))
+
+
+@pytest.mark.parametrize("fresh", ["float16", "fix16"])
+def test_16bit_fresh_leaves_paint_unchanged(small_cfg, poses, reference, fresh):
+    cfg = small_cfg(FRESH_DTYPE=fresh)
+    acc, fr, cov = _run(cfg, poses(cfg))
+    acc_ref, fr_ref, cov_ref = reference
+    np.testing.assert_array_equal(acc, acc_ref)
+    assert cov == cov_ref
+    # stored three times per step and decayed by FRESH_DECAY each step
+    bound = 3.0 * H[fresh] / (1.0 - cfg.FRESH_DECAY)
+    assert np.abs(fr - fr_ref).max() <= bound
+
+
+def test_fix16_accum_within_bound(small_cfg, poses, reference):
+    cfg = small_cfg(ACCUM_DTYPE="fix16", FRESH_DTYPE="fix16")
+    p = poses(cfg)
+    acc, _, cov = _run(cfg, p)
+    # at most three roundings per step; blur and clamp do not amplify them
+    assert np.abs(acc - reference[0]).max() <= 3.0 * H["fix16"] * len(p)
+    # coverage is counted on the stored values
+    assert cov == 100.0 * (acc >= cfg.COVER_THRESH).sum() / acc.size
+
+
+def test_host_decode_matches_device(small_cfg):
+    with psw.PaintSurface(small_cfg(ACCUM_DTYPE="fix16", FRESH_DTYPE="fix16")) as s:
+        s.accum.assign(np.arange(s.N, dtype=np.uint16) * np.uint16(13))
+        host = psw.decode_texels(s.accum.numpy()).astype(np.float64)
+        m = s.metrics()                     # reduced on device through texel_load
+        assert m["max"] == host.max() and m["min"] == host.min()
+        assert m["mean"] == pytest.approx(host.mean(), rel=1e-12)
+        assert psw.decode_texels(np.array([psw.FIX16_ONE], dtype=np.uint16))[0] == 1.0
+
+
+def test_16bit_halves_memory(small_cfg):
+    with psw.PaintSurface(small_cfg()) as f32, \
+         psw.PaintSurface(small_cfg(ACCUM_DTYPE="fix16", FRESH_DTYPE="fix16")) as f16:
+        assert f16.allocated_bytes * 2 == f32.allocated_bytes
+        assert f16.hits_only and not f32.hits_only
+
+
+@pytest.mark.parametrize("acc, fresh", [("float16", "float16"), ("fix16", "float32"),
+                                        ("fix16", "float16"), ("float64", "float32"),
+                                        ("float32", "int8")])
+def test_rejected_storage(small_cfg, acc, fresh):
+    with pytest.raises(ValueError):
+        psw.PaintSurface(small_cfg(ACCUM_DTYPE=acc, FRESH_DTYPE=fresh))
+
+
+def test_tiled_surface_is_float32_only(small_cfg):
+    with pytest.raises(ValueError):
+        psw.make_surface(small_cfg(PAINT_SURFACE="tiled", FRESH_DTYPE="fix16"))
@@ -0,0 +1,52 @@
+"""PAINT_SURFACE="tiled" with PAINT_TILE_EPS=0 holds the dense surface's paint."""
+import numpy as np
+import pytest
+
+from src import paint_surface_warp as psw
+from src import particle_paint as pp
+
+
+def _run(cfg, p):
+    ctx = pp.SprayContext(cfg)
+    ctx.step_many(0, len(p), p)
+    return ctx
+
+
+@pytest.fixture
+def pair(small_cfg, poses):
+    """(dense, tiled) contexts after the same binned run."""
+    dense = small_cfg(DEPOSIT_MODE="binned")
+    tiled = small_cfg(DEPOSIT_MODE="binned", PAINT_SURFACE="tiled", PAINT_TILE=16, PAINT_TILE_EPS=0.0)
+    ctxs = _run(dense, poses(dense)), _run(tiled, poses(tiled))
+    yield ctxs
+    for ctx in ctxs:
+        ctx.close()
+
+
+def test_matches_dense(pair):
+    dense, tiled = (ctx.surface for ctx in pair)
+    assert isinstance(tiled, psw.TiledPaintSurface)
+    assert 0 < tiled.n_slots < tiled.tiles_x * tiled.tiles_y      # only painted tiles
+    np.testing.assert_allclose(tiled.accum_numpy(), dense.accum_numpy(), rtol=0, atol=1e-6)
+    assert tiled.coverage_percent() == dense.coverage_percent()
+    for k, v in dense.metrics().items():
+        assert tiled.metrics()[k] == pytest.approx(v, abs=1e-6), k
+
+
+def test_unfused_effects_match_dense(pair):
+    dense, tiled = (ctx.surface for ctx in pair)
+    for name in ("gaussian_blur_both", "decay_fresh", "clamp_both"):
+        getattr(dense, name)()
+        getattr(tiled, name)()
+        for get in ("get_accum", "get_fresh"):
+            np.testing.assert_allclose(getattr(tiled, get)().numpy(), getattr(dense, get)().numpy(),
+                                       rtol=0, atol=1e-6, err_msg=f"{get} after {name}")
+    assert tiled.coverage_percent() == dense.coverage_percent()
+
+
+def test_get_accum_is_dense(pair):
+    tiled = pair[1].surface
+    acc = tiled.get_accum()
+    assert acc.shape == (tiled.N,)
+    np.testing.assert_array_equal(acc.numpy(), tiled.accum_numpy().ravel())
+    assert tiled.get_dirty() is tiled.dirty